@@ -8,6 +8,7 @@ let state = {
     questions: [],
     currentIndex: 0,
     answers: {},         // { [index]: string }
+    speculative: {},     // { [index]: { answer, promise, controller } } evaluations started before the final submit
     results: [],         // evaluated results in order
     autoSelectCount: false,
     voiceMode: false,
@@ -102,11 +103,12 @@ async function generateQuestions(resumeText, jobDescription, difficulty, numQues
     return await res.json();
 }
 
-async function evaluateAnswer(question, answer) {
+async function evaluateAnswer(question, answer, detailLevel = 'brief', signal = undefined) {
     const res = await fetch(`${API_BASE}/evaluate_answer`, {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({ question, answer })
+        body: JSON.stringify({ question, answer, detail_level: detailLevel }),
+        signal
     });
     if (!res.ok) {
         const err = await res.json().catch(() => ({}));
@@ -115,6 +117,19 @@ async function evaluateAnswer(question, answer) {
     return await res.json();
 }
 
+async function evaluateAnswers(items) {
+    const res = await fetch(`${API_BASE}/evaluate_answers`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ items })
+    });
+    if (!res.ok) {
+        const err = await res.json().catch(() => ({}));
+        throw new Error(err.detail || `Evaluation failed (${res.status})`);
+    }
+    return (await res.json()).results;
+}
+
 // ── UPLOAD LOGIC ──────────────────────────────────────────────────────────────
 function initUpload() {
     const dropZone = $('drop-zone');
@@ -282,6 +297,8 @@ function initStartButton() {
             state.questions = data.questions;
             state.currentIndex = 0;
             state.answers = {};
+            cancelSpeculations();
+            state.speculative = {};
             state.results = [];
             showStep('interview');
             renderQuestion();
@@ -420,6 +437,30 @@ function saveCurrentAnswer() {
     }
 }
 
+// Evaluate an answer in the background once the candidate moves on to the next question.
+// The result is reused at the end of the interview if the answer did not change afterwards;
+// a newer evaluation for the same question aborts the older request.
+function speculateEvaluation(index) {
+    const answer = (state.answers[index] || '').trim();
+    const question = state.questions[index];
+    if (!question || answer.length < 20) return;
+    const previous = state.speculative[index];
+    if (previous && previous.answer === answer) return;
+    if (previous) previous.controller.abort();
+
+    const controller = new AbortController();
+    state.speculative[index] = {
+        answer,
+        controller,
+        // Aborted or failed requests resolve to null and are re-evaluated in the final batch
+        promise: evaluateAnswer(question.text, answer, 'brief', controller.signal).catch(() => null)
+    };
+}
+
+function cancelSpeculations() {
+    Object.values(state.speculative).forEach(spec => spec.controller.abort());
+}
+
 async function handleSubmitCurrentAnswer(timedOut = false) {
     clearInterval(timerInterval);
     if (window.speechSynthesis) window.speechSynthesis.cancel();
@@ -428,18 +469,32 @@ async function handleSubmitCurrentAnswer(timedOut = false) {
     const isLastQuestion = state.currentIndex === state.questions.length - 1;
 
     if (isLastQuestion) {
-        // Evaluate all answers in parallel
+        // Evaluate all answers in one batched request
         showStep('loading');
         $('loading-text').innerText = 'Evaluating all your answers...';
 
         try {
-            const evaluationPromises = state.questions.map(async (q, i) => {
-                const answer = state.answers[i] || (timedOut && i === state.currentIndex ? 'No answer provided.' : 'No answer provided.');
-                const result = await evaluateAnswer(q.text, answer);
-                return { question: q.text, type: q.type, difficulty: q.difficulty, answer: state.answers[i] || '', ...result };
-            });
+            // Reuse background evaluations whose answer is still the submitted one
+            const evaluations = await Promise.all(state.questions.map((q, i) => {
+                const spec = state.speculative[i];
+                return spec && spec.answer === (state.answers[i] || '').trim() ? spec.promise : null;
+            }));
+
+            const pending = state.questions
+                .map((q, i) => i)
+                .filter(i => !evaluations[i]);
+            if (pending.length) {
+                const items = pending.map(i => ({
+                    question: state.questions[i].text,
+                    answer: state.answers[i] || 'No answer provided.'
+                }));
+                const batch = await evaluateAnswers(items);
+                pending.forEach((i, n) => { evaluations[i] = batch[n]; });
+            }
 
-            state.results = await Promise.all(evaluationPromises);
+            state.results = state.questions.map((q, i) => (
+                { question: q.text, type: q.type, difficulty: q.difficulty, answer: state.answers[i] || '', ...evaluations[i] }
+            ));
             showStep('results');
             renderResults();
         } catch (err) {
@@ -447,6 +502,7 @@ async function handleSubmitCurrentAnswer(timedOut = false) {
             showStep('interview');
         }
     } else {
+        speculateEvaluation(state.currentIndex);
         state.currentIndex++;
         renderQuestion();
     }
@@ -607,6 +663,10 @@ function renderResults() {
         if (res.ml_relevance_grade) {
             const relColor = res.ml_relevance_score >= 75 ? 'var(--success)' : (res.ml_relevance_score >= 55 ? '#ffc107' : 'var(--error)');
             relevanceHtml = `<div style="font-size: 0.85rem; margin-top: 4px; color: var(--text-secondary);">Relevance: <span style="color: ${relColor}; font-weight: 600;">${res.ml_relevance_grade} (${res.ml_relevance_score}%)</span></div>`;
+            // The hybrid belongs to the separate full evaluation, so it is shown with that run's own score
+            if (res.hybrid_score !== null && res.hybrid_score !== undefined) {
+                relevanceHtml += `<div style="font-size: 0.85rem; margin-top: 4px; color: var(--text-secondary);">Detailed re-evaluation: ${res.detailed_score}/10 (hybrid ${res.hybrid_score}/10)</div>`;
+            }
         }
 
         const card = document.createElement('div');
@@ -648,7 +708,8 @@ function renderResults() {
                 <div class="ideal-answer-block">
                     <h4 style="color: var(--accent-color);">💡 Ideal Answer</h4>
                     <p>${res.ideal_answer}</p>
-                </div>` : ''}
+                </div>` : `
+                <button class="btn btn-secondary show-ideal-btn" data-idx="${idx}" style="width: auto; margin-top: 12px; padding: 10px 20px;">💡 Show ideal answer</button>`}
 
                 ${res.missing_keywords && res.missing_keywords.length ? `
                 <div style="margin-top: 12px;">
@@ -661,6 +722,31 @@ function renderResults() {
         `;
         feedbackList.appendChild(card);
     });
+
+    // Improvements and ideal answers are only requested when the user asks for them
+    feedbackList.querySelectorAll('.show-ideal-btn').forEach(btn => {
+        btn.addEventListener('click', async () => {
+            const res = state.results[Number(btn.dataset.idx)];
+            btn.disabled = true;
+            btn.innerText = 'Loading ideal answer...';
+            try {
+                const full = await evaluateAnswer(res.question, res.answer || 'No answer provided.', 'full');
+                Object.assign(res, {
+                    improvements: full.improvements,
+                    ideal_answer: full.ideal_answer,
+                    ml_relevance_score: full.ml_relevance_score,
+                    ml_relevance_grade: full.ml_relevance_grade,
+                    detailed_score: full.score,
+                    hybrid_score: full.hybrid_score
+                });
+                renderResults();
+            } catch (err) {
+                btn.disabled = false;
+                btn.innerText = '💡 Show ideal answer';
+                showError('Failed to load ideal answer: ' + err.message);
+            }
+        });
+    });
 }
 
 // ── INIT ──────────────────────────────────────────────────────────────────────
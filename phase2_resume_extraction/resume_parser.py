@@ -1,13 +1,23 @@
 import os
 import json
+import logging
 import re
 import sys
 import shutil
-from pypdf import PdfReader
-from docx import Document
+import hashlib
+from itertools import islice
 from pydantic import BaseModel
 from typing import Optional, List, Any
 
+logger = logging.getLogger(__name__)
+
+# orjson parses the AI's JSON responses several times faster; stdlib json is the fallback
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 # Force UTF-8 output on Windows to avoid charmap UnicodeEncodeError
 if sys.stdout.encoding != 'utf-8':
     sys.stdout.reconfigure(encoding='utf-8', errors='replace')
@@ -34,7 +44,7 @@ try:
     nlp = spacy.load("en_core_web_sm")
 except (ImportError, OSError):
     nlp = None
-    print("spaCy model or library not found. Run: python -m spacy download en_core_web_sm")
+    logger.warning("spaCy model or library not found. Run: python -m spacy download en_core_web_sm")
 
 # Expandable role skills dictionary
 ROLE_SKILLS = {
@@ -130,7 +140,7 @@ def match_skills_to_role(resume_skills: list, job_role: str) -> dict:
         }
         
     except Exception as e:
-        print(f"spaCy skill matching failed: {e}")
+        logger.warning("spaCy skill matching failed: %s", e)
         return _fallback_skill_match(resume_skills, job_role)
 
 def _fallback_skill_match(resume_skills: list, job_role: str) -> dict:
@@ -145,43 +155,102 @@ def _fallback_skill_match(resume_skills: list, job_role: str) -> dict:
     }
 
 def extract_text_from_pdf(filepath: str) -> str:
-    print(f"DEBUG: extract_text_from_pdf called for {filepath}")
+    logger.debug("extract_text_from_pdf called for %s", filepath)
+    # PyMuPDF first: its C core is several times faster than pypdf's pure-Python decoder.
+    # PDF libraries are imported lazily so workers that never see a PDF don't pay for them.
+    try:
+        import fitz  # PyMuPDF
+        # Silence MuPDF's stderr chatter on slightly malformed PDFs; we handle failures ourselves
+        fitz.TOOLS.mupdf_display_errors(False)
+        with fitz.open(filepath) as doc:
+            return "\n".join(page.get_text("text") for page in doc)
+    except Exception as e:
+        logger.warning("PyMuPDF extraction failed, falling back to pypdf: %s", e)
+
     try:
+        from pypdf import PdfReader
         reader = PdfReader(filepath)
         text = ""
         for page in reader.pages:
             try:
                 text += page.extract_text() + "\n"
             except Exception as e:
-                print(f"Error reading PDF page: {e}")
+                logger.warning("Error reading PDF page: %s", e)
                 continue
         return text
     except Exception as e:
-        print(f"Error opening PDF: {e}")
+        logger.warning("Error opening PDF: %s", e)
         return ""
 
 def extract_text_from_docx(filepath: str) -> str:
-    print(f"DEBUG: extract_text_from_docx called for {filepath}")
+    logger.debug("extract_text_from_docx called for %s", filepath)
+    from docx import Document
     doc = Document(filepath)
-    text = []
-    for para in doc.paragraphs:
-        text.append(para.text)
-    return "\n".join(text)
+    return "\n".join(para.text for para in doc.paragraphs)
+
+def _read_txt(filepath: str) -> str:
+    # Binary read + one decode skips text-mode newline translation
+    with open(filepath, "rb") as f:
+        return f.read().decode("utf-8", errors="replace")
+
+# Text extractor per file extension
+_HANDLERS = {
+    ".pdf": extract_text_from_pdf,
+    ".docx": extract_text_from_docx,
+    ".txt": _read_txt
+}
+
+# Keywords used by the quota-exhausted fallback; patterns are compiled once at import
+_TECH_KEYWORDS = [
+    "python", "javascript", "react", "next.js", "node.js", "typescript", "java", "c++", 
+    "aws", "azure", "docker", "kubernetes", "sql", "mongodb", "postgresql", "git",
+    "html", "css", "tailwind", "fastapi", "django", "flask", "spring", "agile", "scrum",
+    "machine learning", "data science", "devops", "ci/cd", "rest api", "graphql"
+]
+_KW_TITLES = {kw: kw.title() for kw in _TECH_KEYWORDS}
+# One alternation scans the text once instead of once per keyword. Longest keywords go
+# first so e.g. "javascript" is preferred over "java" at the same position.
+_KW_UNION = re.compile(
+    r"\b(" + "|".join(re.escape(kw) for kw in sorted(_TECH_KEYWORDS, key=len, reverse=True)) + r")\b",
+    re.IGNORECASE
+)
+
+# Aho-Corasick matches every keyword in one pass over the lowered text; the regex
+# alternation above remains the fallback when pyahocorasick isn't installed.
+try:
+    import ahocorasick
+    _KW_AUTOMATON = ahocorasick.Automaton()
+    for _kw in _TECH_KEYWORDS:
+        _KW_AUTOMATON.add_word(_kw, _kw)
+    _KW_AUTOMATON.make_automaton()
+except ImportError:
+    _KW_AUTOMATON = None
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isalnum() or ch == "_"
+
+def _at_word_boundary(text: str, pos: int) -> bool:
+    """Mirrors regex word-boundary semantics at index `pos`."""
+    before = pos > 0 and _is_word_char(text[pos - 1])
+    after = pos < len(text) and _is_word_char(text[pos])
+    return before != after
+
+def _find_keywords(text: str) -> set:
+    if _KW_AUTOMATON is None:
+        return {m.group(1).lower() for m in _KW_UNION.finditer(text)}
+    lowered = text.lower()
+    return {
+        kw for end, kw in _KW_AUTOMATON.iter(lowered)
+        if _at_word_boundary(lowered, end - len(kw) + 1) and _at_word_boundary(lowered, end + 1)
+    }
 
 def _fallback_keyword_extraction(text: str) -> dict:
-    print("DEBUG: _fallback_keyword_extraction called")
-    tech_keywords = [
-        "python", "javascript", "react", "next.js", "node.js", "typescript", "java", "c++", 
-        "aws", "azure", "docker", "kubernetes", "sql", "mongodb", "postgresql", "git",
-        "html", "css", "tailwind", "fastapi", "django", "flask", "spring", "agile", "scrum",
-        "machine learning", "data science", "devops", "ci/cd", "rest api", "graphql"
-    ]
-    found_skills = []
-    for kw in tech_keywords:
-        if re.search(rf"\b{re.escape(kw)}\b", text, re.IGNORECASE):
-            found_skills.append(kw.title())
-    lines = text.split('\n')
-    found_exp = [line.strip() for line in lines if len(line.strip()) > 50][:10]
+    logger.debug("_fallback_keyword_extraction called")
+    hits = _find_keywords(text)
+    found_skills = [title for kw, title in _KW_TITLES.items() if kw in hits]
+    # Stop after the first 10 long lines instead of stripping the whole document
+    long_lines = (s for s in map(str.strip, text.splitlines()) if len(s) > 50)
+    found_exp = list(islice(long_lines, 10))
     return {
         "raw_text": text,
         "skills": found_skills,
@@ -190,106 +259,152 @@ def _fallback_keyword_extraction(text: str) -> dict:
     }
 
 def _get_model_response(prompt: str, multimodal_filepath: Optional[str] = None, is_json: bool = False) -> str:
-    print(f"DEBUG: _get_model_response called (json={is_json}, file={multimodal_filepath})")
+    logger.debug("_get_model_response called (json=%s, file=%s)", is_json, multimodal_filepath)
     try:
         from ai_utils import run_genai_with_rotation
         return run_genai_with_rotation(prompt, is_json=is_json, multimodal_filepath=multimodal_filepath)
     except ImportError:
-        print("CRITICAL: ai_utils not found in path!")
+        logger.error("ai_utils not found in path!")
         raise
 
-def parse_scanned_resume_multimodal(filepath: str) -> dict:
-    """Combines OCR and Structuring into ONE AI call for quota efficiency."""
-    print(f"DEBUG: Entering parse_scanned_resume_multimodal for {filepath}")
-    try:
-        prompt = """
-        Extract all text from this resume AND organize it into a structured JSON object.
-        JSON fields:
-        - "raw_text": Every word found on the document.
+_STRUCTURE_FIELDS = """
         - "skills": A list of technical and soft skills.
         - "experience": A list of professional roles and achievements.
         - "projects": A list of project names and descriptions.
+"""
+
+def _clean_structured_data(data: dict) -> dict:
+    """Coerces the section fields into flat lists of strings."""
+    for key in ["skills", "experience", "projects"]:
+        raw_items = data.get(key, [])
+        if not isinstance(raw_items, list): raw_items = [raw_items] if raw_items else []
+        cleaned = []
+        for item in raw_items:
+            if isinstance(item, str): cleaned.append(item)
+            elif isinstance(item, dict):
+                name = item.get("name") or item.get("title") or item.get("role") or item.get("skill")
+                cleaned.append(str(name) if name else json.dumps(item))
+            else: cleaned.append(str(item))
+        data[key] = cleaned
+    return data
+
+# Identical resumes (retries, dev reruns) skip the AI call entirely
+_AI_CACHE_DIR = os.path.join(".cache", "resume_ai")
+
+def _ai_cache_key(prompt: str, filepath: Optional[str] = None) -> str:
+    """SHA-256 over the full prompt (so prompt edits invalidate) plus the file bytes."""
+    h = hashlib.sha256(prompt.encode("utf-8"))
+    if filepath:
+        with open(filepath, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+    return h.hexdigest()
+
+def _read_ai_cache(key: str) -> Optional[dict]:
+    path = os.path.join(_AI_CACHE_DIR, f"{key}.json")
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning("Ignoring unreadable AI cache entry %s: %s", path, e)
+        return None
+
+def _write_ai_cache(key: str, data: dict):
+    path = os.path.join(_AI_CACHE_DIR, f"{key}.json")
+    tmp_path = f"{path}.tmp"
+    try:
+        os.makedirs(_AI_CACHE_DIR, exist_ok=True)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning("Could not write AI cache entry %s: %s", path, e)
+
+def _structure_with_ai(raw_text: Optional[str] = None, filepath: Optional[str] = None) -> dict:
+    """
+    Single AI call that returns structured resume JSON from either already-extracted
+    text or a file. The text path sends the text inline, so no file upload is needed.
+    """
+    if raw_text is not None:
+        prompt = f"""
+        Analyze the following resume text and organize it into a structured JSON object.
+        JSON fields:{_STRUCTURE_FIELDS}
+        RESUME TEXT:
+        ---
+        {raw_text}
+        ---
 
         Return ONLY a JSON object.
         """
-        response_text = _get_model_response(prompt, multimodal_filepath=filepath, is_json=True)
-        return json.loads(response_text)
+        filepath = None
+    else:
+        prompt = f"""
+        Extract all text from this resume AND organize it into a structured JSON object.
+        JSON fields:
+        - "raw_text": Every word found on the document.{_STRUCTURE_FIELDS}
+        Return ONLY a JSON object.
+        """
+    cache_key = _ai_cache_key(prompt, filepath)
+    cached = _read_ai_cache(cache_key)
+    if cached is not None:
+        logger.debug("Serving structured resume from cache (%s)", cache_key[:12])
+        return cached
+
+    response_text = _get_model_response(prompt, multimodal_filepath=filepath, is_json=True)
+    data = _clean_structured_data(_json_loads(response_text))
+    _write_ai_cache(cache_key, data)
+    return data
+
+def parse_scanned_resume_multimodal(filepath: str, initial_text: Optional[str] = None) -> dict:
+    """
+    Combines OCR and Structuring into ONE AI call for quota efficiency.
+    `initial_text` is the caller's traditional extraction, reused on 429 instead of re-parsing the file.
+    """
+    logger.debug("Entering parse_scanned_resume_multimodal for %s", filepath)
+    try:
+        return _structure_with_ai(filepath=filepath)
     except Exception as e:
         err_msg = str(e)
-        print(f"Multimodal scan failed error: {err_msg}")
+        logger.warning("Multimodal scan failed error: %s", err_msg)
         if "429" in err_msg:
-             text = extract_text_from_pdf(filepath)
+             text = initial_text if initial_text is not None else extract_text_from_pdf(filepath)
              if len(text) > 10:
                   return _fallback_keyword_extraction(text)
         return {"raw_text": f"AI_ERROR: {err_msg}", "skills": [], "experience": [], "projects": []}
 
 def structure_resume_data(raw_text: str) -> dict:
-    print("DEBUG: structure_resume_data called")
-    prompt = f"""
-    Analyze the following resume text and extract the specific sections.
-    Organize them into a JSON object with these keys:
-    - "skills": A list of strings.
-    - "experience": A list of strings.
-    - "projects": A list of strings.
-
-    RESUME TEXT:
-    ---
-    {raw_text}
-    ---
-
-    Return ONLY a JSON object.
-    """
+    logger.debug("structure_resume_data called")
     try:
-        response_text = _get_model_response(prompt, is_json=True)
-        data = json.loads(response_text)
-        # Cleanup logic
-        for key in ["skills", "experience", "projects"]:
-            raw_items = data.get(key, [])
-            if not isinstance(raw_items, list): raw_items = [raw_items] if raw_items else []
-            cleaned = []
-            for item in raw_items:
-                if isinstance(item, str): cleaned.append(item)
-                elif isinstance(item, dict):
-                    name = item.get("name") or item.get("title") or item.get("role") or item.get("skill")
-                    cleaned.append(str(name) if name else json.dumps(item))
-                else: cleaned.append(str(item))
-            data[key] = cleaned
-        return data
+        return _structure_with_ai(raw_text=raw_text)
     except Exception as e:
-        print(f"Error structuring resume data: {e}")
+        logger.warning("Error structuring resume data: %s", e)
         return {"skills": [], "experience": [], "projects": []}
 
 def parse_resume(filepath: str, job_role: str = "") -> ResumeData:
-    print(f"DEBUG: parse_resume entry point for {filepath}")
+    logger.debug("parse_resume entry point for %s", filepath)
     ext = os.path.splitext(filepath)[1].lower()
-    text = ""
-    
-    if ext == ".pdf":
-        text = extract_text_from_pdf(filepath)
-    elif ext == ".docx":
-        text = extract_text_from_docx(filepath)
-    elif ext == ".txt":
-        with open(filepath, "r", encoding="utf-8") as f:
-            text = f.read()
-    else:
+    handler = _HANDLERS.get(ext)
+    if handler is None:
         raise ValueError(f"Unsupported file format: {ext}")
+    initial_text = handler(filepath)
         
-    extracted_text = text.strip()
+    extracted_text = initial_text.strip()
     
     if len(extracted_text) < 50:
-        print(f"Traditional extraction too short ({len(extracted_text)} chars). Logic: call OCR.")
-        data = parse_scanned_resume_multimodal(filepath)
+        logger.info("Traditional extraction too short (%s chars). Logic: call OCR.", len(extracted_text))
+        data = parse_scanned_resume_multimodal(filepath, initial_text=initial_text)
         extracted_text = data.get("raw_text", "").strip()
         
         if extracted_text.startswith("AI_ERROR:"):
              error_msg = extracted_text.replace("AI_ERROR:", "").strip()
              if "429" in error_msg:
-                  print("Quota exhausted during OCR. Attempting basic text extraction...")
-                  text = extract_text_from_pdf(filepath)
-                  print(f"DEBUG: Fallback extraction got {len(text)} chars")
-                  if len(text) > 0:  # Accept any text at all
-                      print("Using keyword-based fallback for quota-limited resume.")
-                      fallback_data = _fallback_keyword_extraction(text)
+                  logger.info("Quota exhausted during OCR. Falling back to the initial text extraction...")
+                  # Reuse the extraction from above rather than parsing the file again
+                  if len(initial_text) > 0:  # Accept any text at all
+                      logger.info("Using keyword-based fallback for quota-limited resume.")
+                      fallback_data = _fallback_keyword_extraction(initial_text)
                       extracted_skills = fallback_data["skills"]
                       if job_role and extracted_skills:
                           skill_match = match_skills_to_role(extracted_skills, job_role)
@@ -302,7 +417,7 @@ def parse_resume(filepath: str, job_role: str = "") -> ResumeData:
                           skill_match=skill_match
                       )
                   # If truly no text, create a minimal resume to allow interview to proceed
-                  print("No text extracted. Creating minimal resume data.")
+                  logger.info("No text extracted. Creating minimal resume data.")
                   skill_match = _fallback_skill_match(["General Software Development"], "")
                   return ResumeData(
                       text="Resume uploaded (image-based, quota exhausted)", 
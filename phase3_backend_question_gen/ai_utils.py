@@ -1,11 +1,20 @@
 import os
+import json
+import logging
 import time
+import random
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import google.generativeai as genai
+from google.generativeai import client as genai_client
 from dotenv import load_dotenv
-from typing import Optional, List, Any
+from typing import Optional, List, Any, Dict, Tuple, Iterator, Iterable
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Standard models that we've verified work with the current API keys
 # Prioritizing newer Gemini 2.5 models for better performance and quality
 CANDIDATE_MODELS = [
@@ -38,87 +47,559 @@ def get_api_keys() -> List[str]:
     # Split by comma and strip whitespace
     return [k.strip() for k in keys_str.split(",") if k.strip()]
 
+# Client-side adaptive throttling: each key gets a token bucket whose rate backs off
+# multiplicatively on 429s and creeps back up on success (AIMD).
+# The defaults suit free-tier keys; paid-tier keys (or lighter models) can raise them via
+# GEMINI_KEY_RPM (starting rate) and GEMINI_KEY_MAX_RPM (ceiling), both per key per minute.
+DEFAULT_RPM = float(os.getenv("GEMINI_KEY_RPM", "10"))
+MIN_RPM = 1.0
+MAX_RPM = max(float(os.getenv("GEMINI_KEY_MAX_RPM", "15")), DEFAULT_RPM)
+QUOTA_COOLDOWN_SECONDS = 20
+# Longer waits than this fail fast so the caller rotates to another key or falls back
+MAX_ACQUIRE_WAIT_SECONDS = 3.0
+STATE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "recruiter_ai")
+LIMITER_STATE_FILE = os.path.join(STATE_DIR, "rate_limits.json")
+
+def _key_fingerprint(api_key: str) -> str:
+    """Short stable id for a key so raw keys never land in logs or state files."""
+    return hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest()
+
+class LocalRateLimitError(Exception):
+    """Raised by RateLimiter.acquire instead of sleeping past MAX_ACQUIRE_WAIT_SECONDS.
+    The message carries "429" so it reads like the quota error it stands in for."""
+
+class RateLimiter:
+    """Token bucket for a single API key."""
+
+    def __init__(self, rpm: float = DEFAULT_RPM, tokens: Optional[float] = None,
+                 last_refill: Optional[float] = None, cooldown_until: float = 0.0):
+        self.rpm = rpm
+        self.tokens = rpm if tokens is None else tokens
+        self.last_refill = last_refill or time.time()
+        self.cooldown_until = cooldown_until
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = max(0.0, now - self.last_refill)
+        self.tokens = min(self.rpm, self.tokens + elapsed * self.rpm / 60.0)
+        self.last_refill = now
+
+    def cooldown_remaining(self) -> float:
+        return max(0.0, self.cooldown_until - time.time())
+
+    def acquire(self, max_wait: float = MAX_ACQUIRE_WAIT_SECONDS):
+        """
+        Blocks for the minimum time needed to take one token. Raises LocalRateLimitError
+        when that would take longer than `max_wait` seconds.
+        """
+        while True:
+            with self._lock:
+                now = time.time()
+                self._refill(now)
+                if now < self.cooldown_until:
+                    wait = self.cooldown_until - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) * 60.0 / self.rpm
+            if wait > max_wait:
+                raise LocalRateLimitError(f"429 local rate limit: key needs {wait:.1f}s for a free slot")
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.rpm = min(self.rpm * 1.05, MAX_RPM)
+
+    def on_quota_error(self):
+        with self._lock:
+            self.rpm = max(self.rpm * 0.5, MIN_RPM)
+            self.tokens = min(self.tokens, self.rpm)
+            self.cooldown_until = time.time() + QUOTA_COOLDOWN_SECONDS
+
+    def to_dict(self) -> dict:
+        return {
+            "rpm": self.rpm,
+            "tokens": self.tokens,
+            "last_refill": self.last_refill,
+            "cooldown_until": self.cooldown_until
+        }
+
+_LIMITERS: Dict[str, RateLimiter] = {}
+_LIMITERS_LOCK = threading.Lock()
+_LIMITER_STATE_LOADED = False
+
+def _load_limiter_state():
+    global _LIMITER_STATE_LOADED
+    _LIMITER_STATE_LOADED = True
+    if not os.path.exists(LIMITER_STATE_FILE):
+        return
+    try:
+        with open(LIMITER_STATE_FILE, "r") as f:
+            state = json.load(f)
+        # Only a pending cooldown carries over; the learned rate restarts at DEFAULT_RPM so a
+        # bad stretch before a restart doesn't throttle the new process
+        for fingerprint, values in state.items():
+            _LIMITERS[fingerprint] = RateLimiter(cooldown_until=values.get("cooldown_until", 0.0))
+    except Exception as e:
+        logger.warning("Ignoring unreadable rate limiter state: %s", e)
+
+def _write_state_file(path: str, state: dict):
+    """Atomically persists a small JSON state file; failures are logged, never raised."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        logger.warning("Could not persist %s: %s", os.path.basename(path), e)
+
+def _save_limiter_state():
+    with _LIMITERS_LOCK:
+        state = {fp: limiter.to_dict() for fp, limiter in _LIMITERS.items()}
+    _write_state_file(LIMITER_STATE_FILE, state)
+
+def get_rate_limiter(api_key: str) -> RateLimiter:
+    """Returns the process-wide limiter for a key, restoring persisted state on first use."""
+    fingerprint = _key_fingerprint(api_key)
+    with _LIMITERS_LOCK:
+        if not _LIMITER_STATE_LOADED:
+            _load_limiter_state()
+        if fingerprint not in _LIMITERS:
+            _LIMITERS[fingerprint] = RateLimiter()
+        return _LIMITERS[fingerprint]
+
+# Per-model outcome stats, used to try historically reliable models first and to skip
+# models that are quota-limited right now. A 429 only sidelines the model for the key
+# that got it; once QUOTA_EXHAUSTED_KEY_COUNT keys in a row hit it, it is parked for all keys.
+MODEL_STATS_FILE = os.path.join(STATE_DIR, "model_stats.json")
+RECENT_429_SKIP_SECONDS = 60
+QUOTA_EXHAUSTED_SECONDS = 300
+QUOTA_EXHAUSTED_KEY_COUNT = 3
+
+_MODEL_STATS: Optional[Dict[str, dict]] = None
+_MODEL_STATS_LOCK = threading.Lock()
+
+def _model_stats() -> Dict[str, dict]:
+    """Lazily loads persisted model stats; callers must hold _MODEL_STATS_LOCK."""
+    global _MODEL_STATS
+    if _MODEL_STATS is None:
+        _MODEL_STATS = {}
+        if os.path.exists(MODEL_STATS_FILE):
+            try:
+                with open(MODEL_STATS_FILE, "r") as f:
+                    _MODEL_STATS = json.load(f)
+            except Exception as e:
+                logger.warning("Ignoring unreadable model stats: %s", e)
+    return _MODEL_STATS
+
+def _model_entry(model_name: str) -> dict:
+    entry = _model_stats().setdefault(model_name, {})
+    entry.setdefault("success", 0)
+    entry.setdefault("fail_429", 0)
+    entry.setdefault("last_429_by_key", {})
+    entry.setdefault("exhausted_until", 0.0)
+    entry.setdefault("streak_429_keys", [])
+    return entry
+
+def _record_model_success(model_name: str):
+    with _MODEL_STATS_LOCK:
+        entry = _model_entry(model_name)
+        entry["success"] += 1
+        entry["streak_429_keys"] = []
+        state = {name: dict(entry) for name, entry in _model_stats().items()}
+    _write_state_file(MODEL_STATS_FILE, state)
+
+def _record_model_429(model_name: str, api_key: str):
+    """Counts a 429; the same model failing on several different keys in a row means an
+    account-wide quota, so the model is parked for a few minutes."""
+    now = time.time()
+    with _MODEL_STATS_LOCK:
+        entry = _model_entry(model_name)
+        entry["fail_429"] += 1
+        fingerprint = _key_fingerprint(api_key)
+        # Per-key 429 times; stale ones are dropped so the map stays at most one entry per key
+        entry["last_429_by_key"] = {
+            fp: at for fp, at in entry["last_429_by_key"].items() if now - at < RECENT_429_SKIP_SECONDS
+        }
+        entry["last_429_by_key"][fingerprint] = now
+        if fingerprint not in entry["streak_429_keys"]:
+            entry["streak_429_keys"] = entry["streak_429_keys"] + [fingerprint]
+        if len(entry["streak_429_keys"]) >= QUOTA_EXHAUSTED_KEY_COUNT:
+            logger.warning("Model[%s] quota-exhausted across keys. Parking for %ss...", model_name, QUOTA_EXHAUSTED_SECONDS)
+            entry["exhausted_until"] = now + QUOTA_EXHAUSTED_SECONDS
+            entry["streak_429_keys"] = []
+        state = {name: dict(entry) for name, entry in _model_stats().items()}
+    _write_state_file(MODEL_STATS_FILE, state)
+
+def _order_models(models: List[str]) -> List[str]:
+    """
+    Sorts models by observed success rate (stable, so unseen models keep their configured
+    order) and drops parked ones. Never returns an empty list.
+    """
+    now = time.time()
+    with _MODEL_STATS_LOCK:
+        stats = _model_stats()
+
+        def success_rate(model_name: str) -> float:
+            entry = stats.get(model_name)
+            if not entry:
+                return 0.5
+            # Laplace smoothing keeps a single early failure from burying a model
+            return (entry.get("success", 0) + 1) / (entry.get("success", 0) + entry.get("fail_429", 0) + 2)
+
+        ordered = sorted(models, key=success_rate, reverse=True)
+        available = [m for m in ordered if now >= stats.get(m, {}).get("exhausted_until", 0.0)]
+    return available or ordered
+
+def _models_for_key(models: List[str], api_key: str) -> List[str]:
+    """
+    Filters an already ranked model list for one key, keeping its order: drops parked
+    models and those this key got a 429 for in the last RECENT_429_SKIP_SECONDS.
+    Never returns an empty list.
+    """
+    now = time.time()
+    fingerprint = _key_fingerprint(api_key)
+    with _MODEL_STATS_LOCK:
+        stats = _model_stats()
+
+        def is_available(model_name: str) -> bool:
+            entry = stats.get(model_name, {})
+            if now < entry.get("exhausted_until", 0.0):
+                return False
+            return now - entry.get("last_429_by_key", {}).get(fingerprint, 0.0) >= RECENT_429_SKIP_SECONDS
+
+        available = [m for m in models if is_available(m)]
+    return available or models
+
+# Models are built once per (key fingerprint, model, json mode, response schema, system instruction)
+# and reused across calls.
+# configure() mutates global SDK state, so it only runs when the active key changes, and
+# always under _GENAI_LOCK so parallel key probes can't interleave it.
+_MODEL_CACHE: Dict[Tuple[str, str, bool, Any, Optional[str]], genai.GenerativeModel] = {}
+_GENAI_LOCK = threading.Lock()
+_configured_key_fp: Optional[str] = None
+
+def _configure_key_locked(api_key: str):
+    """Caller must hold _GENAI_LOCK."""
+    global _configured_key_fp
+    fingerprint = _key_fingerprint(api_key)
+    if fingerprint != _configured_key_fp:
+        genai.configure(api_key=api_key)
+        _configured_key_fp = fingerprint
+
+def _get_model(
+    api_key: str,
+    model_name: str,
+    is_json: bool,
+    response_schema: Any = None,
+    system_instruction: Optional[str] = None
+) -> genai.GenerativeModel:
+    cache_key = (_key_fingerprint(api_key), model_name, is_json, response_schema, system_instruction)
+    with _GENAI_LOCK:
+        model = _MODEL_CACHE.get(cache_key)
+        if model is None:
+            _configure_key_locked(api_key)
+            config = {"response_mime_type": "application/json"} if is_json else {}
+            if is_json and response_schema is not None:
+                # Server-side constrained decoding: the reply always matches the schema
+                config["response_schema"] = response_schema
+            model = genai.GenerativeModel(
+                model_name, generation_config=config, system_instruction=system_instruction
+            )
+            # The SDK otherwise resolves the client lazily from whatever key is configured
+            # at first use; bind it now so each cached model keeps talking with its own key.
+            model._client = genai_client.get_default_generative_client()
+            _MODEL_CACHE[cache_key] = model
+        return model
+
+def prewarm_models(
+    variants: Iterable[Tuple[Any, Optional[str]]] = ((None, None),),
+    model_count: int = 1
+):
+    """
+    Builds the JSON-mode models for every key ahead of the first request, for the
+    `model_count` models currently ranked best. `variants` are the
+    (response_schema, system_instruction) pairs the callers pass to
+    run_genai_with_rotation, so the prewarmed entries are the ones they look up.
+    Purely local: no API call is made.
+    """
+    models = _order_models(CANDIDATE_MODELS)[:model_count]
+    variants = list(variants)
+    for api_key in get_api_keys():
+        for model_name in models:
+            for response_schema, system_instruction in variants:
+                try:
+                    _get_model(api_key, model_name, True, response_schema, system_instruction)
+                except Exception as e:
+                    logger.warning("Could not prewarm %s: %s", model_name, e)
+
+def _upload_file(api_key: str, filepath: str) -> Any:
+    # Uploads go through the globally configured client, so they are serialized
+    with _GENAI_LOCK:
+        _configure_key_locked(api_key)
+        return genai.upload_file(path=filepath)
+
+# Uploaded files are kept alive and reused per (file content, key) instead of being
+# re-uploaded on every call; Gemini expires them after 48h, so re-upload a bit before.
+UPLOAD_TTL_SECONDS = 47 * 3600
+_UPLOADED: Dict[str, Dict[str, Tuple[Any, float]]] = {}
+
+def _file_sha256(filepath: str) -> str:
+    h = hashlib.sha256()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _get_uploaded_file(content_hash: str, api_key: str) -> Optional[Any]:
+    fingerprint = _key_fingerprint(api_key)
+    with _GENAI_LOCK:
+        per_key = _UPLOADED.get(content_hash, {})
+        entry = per_key.get(fingerprint)
+        if entry and time.time() - entry[1] < UPLOAD_TTL_SECONDS:
+            return entry[0]
+        # Expired handles are useless to every caller, so drop them instead of bypassing
+        if entry:
+            del per_key[fingerprint]
+            if not per_key:
+                del _UPLOADED[content_hash]
+    return None
+
+def _prune_uploaded_locked(now: float):
+    """Drops expired handles for all files; caller must hold _GENAI_LOCK."""
+    for content_hash in list(_UPLOADED):
+        per_key = _UPLOADED[content_hash]
+        for fingerprint in [fp for fp, (_, at) in per_key.items() if now - at >= UPLOAD_TTL_SECONDS]:
+            del per_key[fingerprint]
+        if not per_key:
+            del _UPLOADED[content_hash]
+
+def _remember_uploaded_file(content_hash: str, api_key: str, uploaded_file: Any):
+    now = time.time()
+    with _GENAI_LOCK:
+        _prune_uploaded_locked(now)
+        _UPLOADED.setdefault(content_hash, {})[_key_fingerprint(api_key)] = (uploaded_file, now)
+
+# Keys are tried one at a time. The next key starts as soon as the current one fails, or as
+# a hedge once a probe has been silent for HEDGE_DELAY_SECONDS (well past a normal Gemini
+# round-trip), with at most MAX_PARALLEL_KEYS probes in flight. Losing calls still spend quota,
+# so hedging is reserved for genuinely slow calls.
+MAX_PARALLEL_KEYS = 3
+HEDGE_DELAY_SECONDS = 8.0
+
+def _try_one_key(
+    key_index: int,
+    api_key: str,
+    prompt: Any,
+    is_json: bool,
+    multimodal_filepath: Optional[str],
+    content_hash: Optional[str],
+    models_to_try: List[str],
+    done: threading.Event,
+    response_schema: Any = None,
+    system_instruction: Optional[str] = None
+) -> str:
+    """Runs the model rotation for a single key. Raises the last error if nothing succeeded."""
+    limiter = get_rate_limiter(api_key)
+    last_error = None
+
+    # If we have a multimodal file, reuse or upload it for THIS key
+    multimodal_file = None
+    if multimodal_filepath:
+        multimodal_file = _get_uploaded_file(content_hash, api_key)
+        if multimodal_file:
+            logger.info("AI Call: Reusing uploaded multimodal file for Key[%s]", key_index)
+    if multimodal_filepath and not multimodal_file:
+        try:
+            limiter.acquire()
+            if done.is_set():
+                raise Exception("Another key already answered.")
+            logger.info("AI Call: Uploading multimodal file with Key[%s]...", key_index)
+            multimodal_file = _upload_file(api_key, multimodal_filepath)
+            _remember_uploaded_file(content_hash, api_key, multimodal_file)
+        except LocalRateLimitError as e:
+            logger.warning("Key[%s] is throttled locally (%s). Moving to NEXT KEY...", key_index, e)
+            raise
+        except Exception as upload_err:
+            logger.warning("Upload failed with Key[%s]: %s", key_index, upload_err)
+            if "429" in str(upload_err):
+                logger.warning("Quota hit on upload. Moving to NEXT KEY...")
+                limiter.on_quota_error()
+                _save_limiter_state()
+            raise
+
+    # Iterate through each MODEL for the current key
+    for model_index, model_name in enumerate(models_to_try):
+        try:
+            # After the first model, add a tiny jittered throttle so retries from
+            # concurrent workers don't arrive in lockstep
+            if model_index > 0:
+                time.sleep(random.uniform(0.5, 1.5))
+
+            limiter.acquire()
+            if done.is_set():
+                break
+            logger.info("AI Call: Key[%s] Model[%s]...", key_index, model_name)
+
+            model = _get_model(api_key, model_name, is_json, response_schema, system_instruction)
+
+            content = [multimodal_file, prompt] if multimodal_file else prompt
+            response = model.generate_content(content)
+
+            if response and response.text:
+                limiter.on_success()
+                _save_limiter_state()
+                _record_model_success(model_name)
+                # Success! The uploaded file stays cached for later calls
+                return response.text
+        except LocalRateLimitError as e:
+            # Nothing reached the API, so the key's rate and the model stats stay as they are
+            logger.warning("Key[%s] is throttled locally (%s). Moving to NEXT KEY...", key_index, e)
+            last_error = e
+            break
+        except Exception as e:
+            err_str = str(e)
+            logger.warning("Failed with Key[%s] Model[%s]: %s...", key_index, model_name, err_str[:100])
+            last_error = e
+
+            # If it's a 429 (Quota), we should definitely try the NEXT KEY immediately
+            if "429" in err_str:
+                logger.warning("Quota hit on this key or during gen. Moving to NEXT KEY...")
+                limiter.on_quota_error()
+                _save_limiter_state()
+                _record_model_429(model_name, api_key)
+                break # Break model loop to try next key
+
+            # If it's a 404 (Model missing), we stay on the same key and try next model
+            if "404" in err_str:
+                continue
+
+            # For other errors, we try the next model on the same key
+            continue
+
+    raise last_error or Exception(f"All models failed for key {key_index}.")
+
 def run_genai_with_rotation(
     prompt: Any, 
     is_json: bool = False, 
     multimodal_filepath: Optional[str] = None, # Path to local file
-    custom_models: Optional[List[str]] = None
+    custom_models: Optional[List[str]] = None,
+    response_schema: Any = None, # TypedDict/list type; only used with is_json=True
+    system_instruction: Optional[str] = None # Static instructions, kept out of the user turn
 ) -> str:
     """
     Executes a GenAI call with both Key Rotation and Model Rotation.
-    If Key A hits a 429, it tries Key B with the same model series.
+    If Key A fails (e.g. a 429), Key B gets its turn with the same model series; if Key A is
+    merely slow, Key B is started as a hedge after HEDGE_DELAY_SECONDS and the first success wins.
     """
     keys = get_api_keys()
     if not keys:
         raise ValueError("No GEMINI_API_KEY found in .env")
     
-    models_to_try = custom_models or CANDIDATE_MODELS
+    # Ranked once per call so every key walks the same model series
+    models_to_try = _order_models(custom_models or CANDIDATE_MODELS)
     last_error = None
     
-    # Outer Loop: Iterate through each API KEY
-    for key_index, api_key in enumerate(keys):
-        try:
-            genai.configure(api_key=api_key)
-            
-            # If we have a multimodal file, upload it for THIS key
-            multimodal_file = None
-            if multimodal_filepath:
-                try:
-                    print(f"AI Call: Uploading multimodal file with Key[{key_index}]...")
-                    multimodal_file = genai.upload_file(path=multimodal_filepath)
-                except Exception as upload_err:
-                    print(f" - Upload failed with Key[{key_index}]: {upload_err}")
-                    if "429" in str(upload_err):
-                        print(" - Quota hit on upload. Moving to NEXT KEY...")
-                        continue # Try next key
-                    last_error = upload_err
-                    continue
-
-            # Inner Loop: Iterate through each MODEL for the current key
-            for model_index, model_name in enumerate(models_to_try):
+    content_hash = _file_sha256(multimodal_filepath) if multimodal_filepath else None
+
+    # Keys still cooling down from a recent 429 are tried last (stable order otherwise)
+    ordered_keys = sorted(enumerate(keys), key=lambda item: get_rate_limiter(item[1]).cooldown_remaining() > 0)
+
+    done = threading.Event()
+    # Another key would upload its own copy of the file, so multimodal calls fail over but never hedge
+    hedge_delay = None if multimodal_filepath else HEDGE_DELAY_SECONDS
+
+    def probe(key_index: int, api_key: str) -> str:
+        if done.is_set():
+            raise Exception("Another key already answered.")
+        # Filtered at probe time: models parked by an earlier probe are skipped, while a
+        # model that only throttled some other key is still tried here
+        result = _try_one_key(
+            key_index, api_key, prompt, is_json, multimodal_filepath, content_hash,
+            _models_for_key(models_to_try, api_key), done, response_schema, system_instruction
+        )
+        done.set()
+        return result
+
+    remaining = list(ordered_keys)
+    in_flight = set()
+    executor = ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_KEYS, len(ordered_keys)), thread_name_prefix="genai-key")
+    try:
+        while remaining or in_flight:
+            if remaining and len(in_flight) < MAX_PARALLEL_KEYS:
+                key_index, api_key = remaining.pop(0)
+                if in_flight:
+                    logger.info("AI Call: no answer after %ss, hedging with Key[%s]", hedge_delay, key_index)
+                in_flight.add(executor.submit(probe, key_index, api_key))
+            finished, in_flight = wait(
+                in_flight, timeout=hedge_delay if remaining else None, return_when=FIRST_COMPLETED
+            )
+            for future in finished:
                 try:
-                    # If this isn't the first attempt ever, add a tiny throttle to avoid burst limits
-                    if key_index > 0 or model_index > 0:
-                        time.sleep(1)
-                        
-                    print(f"AI Call: Key[{key_index}] Model[{model_name}]...")
-                    
-                    config = {"response_mime_type": "application/json"} if is_json else {}
-                    model = genai.GenerativeModel(model_name, generation_config=config)
-                    
-                    content = [multimodal_file, prompt] if multimodal_file else prompt
-                    response = model.generate_content(content)
-                    
-                    if response and response.text:
-                        # Success! Cleanup and return
-                        if multimodal_file:
-                            try: genai.delete_file(multimodal_file.name)
-                            except: pass
-                        return response.text
+                    return future.result()
                 except Exception as e:
-                    err_str = str(e)
-                    print(f" - Failed with Key[{key_index}] Model[{model_name}]: {err_str[:100]}...")
                     last_error = e
-                    
-                    # If it's a 429 (Quota), we should definitely try the NEXT KEY immediately
-                    if "429" in err_str:
-                        print(" - Quota hit on this key or during gen. Moving to NEXT KEY...")
-                        break # Break model loop to try next key
-                    
-                    # If it's a 404 (Model missing), we stay on the same key and try next model
-                    if "404" in err_str:
-                        continue
-                        
-                    # For other errors, we try the next model on the same key
-                    continue
-            
-            # If we finished the model loop without success, cleanup for this key
-            if multimodal_file:
-                try: genai.delete_file(multimodal_file.name)
-                except: pass
-
-        except Exception as key_setup_err:
-            print(f"CRITICAL: Failed to configure key {key_index}: {key_setup_err}")
-            continue
-            
+    finally:
+        # In-flight SDK calls can't be interrupted; they finish on their own and are ignored
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    raise last_error or Exception("All API keys and models failed.")
+
+def stream_genai_with_rotation(
+    prompt: Any,
+    is_json: bool = False,
+    custom_models: Optional[List[str]] = None,
+    response_schema: Any = None,
+    system_instruction: Optional[str] = None
+) -> Iterator[str]:
+    """
+    Streaming variant of run_genai_with_rotation: yields response text chunks as Gemini
+    produces them. Keys and models are tried one after another until a stream starts;
+    once the first chunk is out the call is committed to that stream.
+    """
+    keys = get_api_keys()
+    if not keys:
+        raise ValueError("No GEMINI_API_KEY found in .env")
+
+    last_error = None
+    models_to_try = _order_models(custom_models or CANDIDATE_MODELS)
+    ordered_keys = sorted(enumerate(keys), key=lambda item: get_rate_limiter(item[1]).cooldown_remaining() > 0)
+    for key_index, api_key in ordered_keys:
+        limiter = get_rate_limiter(api_key)
+        for model_name in _models_for_key(models_to_try, api_key):
+            try:
+                limiter.acquire()
+                logger.info("AI Stream: Key[%s] Model[%s]...", key_index, model_name)
+                model = _get_model(api_key, model_name, is_json, response_schema, system_instruction)
+                chunks = iter(model.generate_content(prompt, stream=True))
+                first_chunk = next(chunks, None)
+            except LocalRateLimitError as e:
+                logger.warning("Key[%s] is throttled locally (%s). Moving to NEXT KEY...", key_index, e)
+                last_error = e
+                break
+            except Exception as e:
+                err_str = str(e)
+                logger.warning("Stream failed with Key[%s] Model[%s]: %s...", key_index, model_name, err_str[:100])
+                last_error = e
+                if "429" in err_str:
+                    limiter.on_quota_error()
+                    _save_limiter_state()
+                    _record_model_429(model_name, api_key)
+                    break
+                continue
+
+            if first_chunk is None:
+                continue
+            limiter.on_success()
+            _save_limiter_state()
+            _record_model_success(model_name)
+            if first_chunk.text:
+                yield first_chunk.text
+            for chunk in chunks:
+                if chunk.text:
+                    yield chunk.text
+            return
+
     raise last_error or Exception("All API keys and models failed.")
@@ -0,0 +1,201 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import hashlib
+import importlib.util
+import threading
+from contextlib import closing
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Response cache in front of Gemini calls. Entries live in SQLite and are looked up by an
+# exact key (the parts of a request that must match byte-for-byte) plus the normalized
+# free-text part. Caches created with semantic=True also match that text by embedding
+# similarity; this is opt-in and needs the optional sentence-transformers package, which is
+# only imported (and its model loaded) on the first semantic lookup or write.
+try:
+    import numpy as np
+    EMBEDDINGS_AVAILABLE = importlib.util.find_spec("sentence_transformers") is not None
+except ImportError:
+    EMBEDDINGS_AVAILABLE = False
+
+# Exact-prompt cache that survives restarts; diskcache is optional as well
+try:
+    import diskcache
+    DISKCACHE_AVAILABLE = True
+except ImportError:
+    DISKCACHE_AVAILABLE = False
+
+PROMPT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "mockinterview_llm")
+PROMPT_CACHE_TTL_SECONDS = 7 * 24 * 3600
+_prompt_cache = None
+
+CACHE_DB_PATH = os.path.join(os.path.expanduser("~"), ".cache", "recruiter_ai", "semantic_llm_cache.sqlite3")
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+DEFAULT_THRESHOLD = 0.95
+# Oldest rows beyond this are dropped on write so the table cannot grow without bound
+MAX_ENTRIES_PER_NAMESPACE = 2000
+
+_embedder = None
+_embedder_failed = False
+_embedder_lock = threading.Lock()
+
+def _get_embedder():
+    """Loads the sentence-transformer once per process; returns None if unavailable."""
+    global _embedder, _embedder_failed
+    if not EMBEDDINGS_AVAILABLE or _embedder_failed:
+        return None
+    with _embedder_lock:
+        if _embedder is None and not _embedder_failed:
+            try:
+                from sentence_transformers import SentenceTransformer
+                _embedder = SentenceTransformer(EMBEDDING_MODEL)
+            except Exception as e:
+                logger.warning("Embedding model unavailable, semantic cache falls back to exact text: %s", e)
+                _embedder_failed = True
+    return _embedder
+
+def normalize_text(text: str) -> str:
+    """Lowercases and collapses whitespace so trivial formatting differences still hit."""
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+def _get_prompt_cache():
+    global _prompt_cache
+    if _prompt_cache is None and DISKCACHE_AVAILABLE:
+        try:
+            _prompt_cache = diskcache.Cache(PROMPT_CACHE_DIR)
+        except Exception as e:
+            logger.warning("Prompt cache unavailable: %s", e)
+    return _prompt_cache
+
+def prompt_cache_get(prompt_hash: str) -> Optional[str]:
+    """Cache failures count as a miss so the caller just goes to the LLM."""
+    cache = _get_prompt_cache()
+    if cache is None:
+        return None
+    try:
+        return cache.get(prompt_hash)
+    except Exception as e:
+        logger.warning("Prompt cache lookup failed: %s", e)
+        return None
+
+def prompt_cache_set(prompt_hash: str, response_text: str):
+    cache = _get_prompt_cache()
+    if cache is None:
+        return
+    try:
+        cache.set(prompt_hash, response_text, expire=PROMPT_CACHE_TTL_SECONDS)
+    except Exception as e:
+        logger.warning("Prompt cache write failed: %s", e)
+
+class SemanticLLMCache:
+    """
+    Stores raw LLM response text per namespace (one per call site).
+    By default only identical normalized text hits and no embeddings are computed;
+    semantic=True opts into embedding similarity (needs sentence-transformers).
+    """
+
+    def __init__(self, namespace: str, db_path: str = CACHE_DB_PATH, semantic: bool = False,
+                 max_entries: int = MAX_ENTRIES_PER_NAMESPACE):
+        self.namespace = namespace
+        self.db_path = db_path
+        self.semantic = semantic
+        self.max_entries = max_entries
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=5)
+        if not self._ready:
+            with self._lock:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS entries ("
+                    "namespace TEXT, exact_key TEXT, text TEXT, embedding BLOB, value TEXT, created_at REAL)"
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_key ON entries (namespace, exact_key)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_age ON entries (namespace, created_at)")
+                conn.commit()
+                self._ready = True
+        return conn
+
+    def _embed(self, text: str):
+        embedder = _get_embedder() if self.semantic else None
+        if embedder is None:
+            return None
+        return embedder.encode(text, normalize_embeddings=True).astype(np.float32)
+
+    def get(self, text: str, exact_key: str = "", threshold: float = DEFAULT_THRESHOLD) -> Optional[str]:
+        """Returns the cached response whose text is most similar (>= threshold), if any."""
+        try:
+            text = normalize_text(text)
+            with closing(self._connect()) as conn:
+                if not self.semantic:
+                    row = conn.execute(
+                        "SELECT value FROM entries WHERE namespace = ? AND exact_key = ? AND text = ? "
+                        "ORDER BY created_at DESC LIMIT 1",
+                        (self.namespace, exact_key, text)
+                    ).fetchone()
+                    return row[0] if row else None
+                rows = conn.execute(
+                    "SELECT text, embedding, value FROM entries WHERE namespace = ? AND exact_key = ?",
+                    (self.namespace, exact_key)
+                ).fetchall()
+            if not rows:
+                return None
+            for row_text, _, value in rows:
+                if row_text == text:
+                    return value
+
+            query = self._embed(text)
+            if query is None:
+                return None
+            best_score, best_value = 0.0, None
+            for _, blob, value in rows:
+                if not blob:
+                    continue
+                score = float(np.dot(query, np.frombuffer(blob, dtype=np.float32)))
+                if score > best_score:
+                    best_score, best_value = score, value
+            if best_score >= threshold:
+                logger.debug("Semantic cache hit in %s (similarity %.3f)", self.namespace, best_score)
+                return best_value
+            return None
+        except Exception as e:
+            logger.warning("LLM cache lookup failed: %s", e)
+            return None
+
+    def set(self, text: str, value: str, exact_key: str = ""):
+        try:
+            text = normalize_text(text)
+            embedding = self._embed(text)
+            blob = embedding.tobytes() if embedding is not None else None
+            with closing(self._connect()) as conn:
+                # One row per (exact_key, text): a rewrite replaces the old response
+                conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND exact_key = ? AND text = ?",
+                    (self.namespace, exact_key, text)
+                )
+                conn.execute(
+                    "INSERT INTO entries (namespace, exact_key, text, embedding, value, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.namespace, exact_key, text, blob, value, time.time())
+                )
+                conn.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND rowid NOT IN ("
+                    "SELECT rowid FROM entries WHERE namespace = ? ORDER BY created_at DESC LIMIT ?)",
+                    (self.namespace, self.namespace, self.max_entries)
+                )
+                conn.commit()
+        except Exception as e:
+            logger.warning("LLM cache write failed: %s", e)
+
+# Both stay exact: answers that merely read alike can deserve different scores, and the
+# role (the only free text in the question key) is a fixed string in practice
+question_cache = SemanticLLMCache("generate_questions")
+evaluation_cache = SemanticLLMCache("evaluate")
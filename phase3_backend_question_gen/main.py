@@ -2,12 +2,14 @@ from fastapi import FastAPI, UploadFile, File, Form, HTTPException
 from pydantic import BaseModel
 import sys
 import os
+import logging
 import shutil
 import hashlib
 import json
 from typing import List
 from dotenv import load_dotenv
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from question_bank import get_fallback_questions
 
 # Force UTF-8 output on Windows to avoid charmap UnicodeEncodeError
@@ -18,6 +20,12 @@ if sys.stderr.encoding != 'utf-8':
 
 load_dotenv()
 
+# Module loggers (resume parser, AI utils) are quiet below this level; set LOG_LEVEL=DEBUG to trace
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO").upper(),
+    format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+)
+
 CACHE_FILE = "question_cache.json"
 
 def get_cache_key(resume_text: str, role: str, num_questions: int, difficulty: str, job_description: str, auto_select_count: bool) -> str:
@@ -60,6 +68,21 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+def prewarm_ai_models():
+    # Build the per-key Gemini models now instead of on the first interview request,
+    # with the same schema/system instruction pairs the generator and evaluator use
+    from ai_utils import prewarm_models
+    from question_generator import PREWARM_VARIANTS as QUESTION_VARIANTS
+    variants = list(QUESTION_VARIANTS)
+    sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'phase4_answer_evaluation')))
+    try:
+        from evaluator import PREWARM_VARIANTS as EVALUATION_VARIANTS
+        variants += EVALUATION_VARIANTS
+    except ImportError as e:
+        print(f"WARNING: Skipping evaluator prewarm: {e}")
+    prewarm_models(variants)
+
 class QuestionRequest(BaseModel):
     resume_text: str
     job_description: str = ""
@@ -182,13 +205,44 @@ def generate_questions(request: QuestionRequest):
         # Return static questions if AI failed
         return QuestionResponse(questions=questions_data)
 
+@app.post("/generate_questions_stream")
+def generate_questions_stream(request: QuestionRequest):
+    """Same as /generate_questions, but streams one JSON question per line (NDJSON) as each is ready."""
+    if not question_generator:
+         raise HTTPException(status_code=500, detail="QuestionGenerator not initialized")
+
+    if request.num_questions < 1 or request.num_questions > 20:
+        raise HTTPException(status_code=400, detail="num_questions must be between 1 and 20")
+    
+    valid_difficulties = ["easy", "medium", "hard", "mixed"]
+    if request.difficulty not in valid_difficulties:
+        raise HTTPException(status_code=400, detail=f"difficulty must be one of: {valid_difficulties}")
+
+    target_role = "Software Engineer"
+    
+    def question_lines():
+        for question in question_generator.stream_questions(
+            resume_text=request.resume_text,
+            role=target_role,
+            num_questions=request.num_questions,
+            difficulty=request.difficulty,
+            job_description=request.job_description,
+            auto_select_count=request.auto_select_count
+        ):
+            yield json.dumps(QuestionModel(**question).dict()) + "\n"
+
+    return StreamingResponse(question_lines(), media_type="application/x-ndjson")
+
 @app.post("/evaluate_answer")
 def evaluate_answer(data: dict):
     question = data.get("question")
     answer = data.get("answer")
+    detail_level = data.get("detail_level", "brief")
     
     if not question or not answer:
         raise HTTPException(status_code=400, detail="Missing question or answer")
+    if detail_level not in ("brief", "full"):
+        raise HTTPException(status_code=400, detail="detail_level must be 'brief' or 'full'")
         
     try:
         # Import dynamically to ensure path is ready or use the sys.path hack
@@ -196,22 +250,48 @@ def evaluate_answer(data: dict):
         from evaluator import AnswerEvaluator
         
         evaluator = AnswerEvaluator()
-        result = evaluator.evaluate(question, answer)
+        result = evaluator.evaluate(question, answer, detail_level=detail_level)
         
-        return {
-            "score": result.score,
-            "feedback": result.feedback,
-            "missing_keywords": result.missing_keywords,
-            "improvements": result.improvements,
-            "ideal_answer": result.ideal_answer,
-            "ml_relevance_score": getattr(result, "ml_relevance_score", None),
-            "ml_relevance_grade": getattr(result, "ml_relevance_grade", None),
-            "hybrid_score": getattr(result, "hybrid_score", None)
-        }
+        return evaluation_to_dict(result)
     except Exception as e:
         print(f"Evaluation Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/evaluate_answers")
+def evaluate_answers(data: dict):
+    """End-of-interview scoring: all answers are evaluated with a single LLM call."""
+    items = data.get("items") or []
+    detail_level = data.get("detail_level", "brief")
+    
+    if not items or any(not item.get("question") or not item.get("answer") for item in items):
+        raise HTTPException(status_code=400, detail="Missing question or answer")
+    if detail_level not in ("brief", "full"):
+        raise HTTPException(status_code=400, detail="detail_level must be 'brief' or 'full'")
+        
+    try:
+        sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'phase4_answer_evaluation')))
+        from evaluator import AnswerEvaluator
+        
+        evaluator = AnswerEvaluator()
+        results = evaluator.evaluate_batch([(item["question"], item["answer"], []) for item in items], detail_level)
+        
+        return {"results": [evaluation_to_dict(result) for result in results]}
+    except Exception as e:
+        print(f"Batch Evaluation Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def evaluation_to_dict(result) -> dict:
+    return {
+        "score": result.score,
+        "feedback": result.feedback,
+        "missing_keywords": result.missing_keywords,
+        "improvements": result.improvements,
+        "ideal_answer": result.ideal_answer,
+        "ml_relevance_score": getattr(result, "ml_relevance_score", None),
+        "ml_relevance_grade": getattr(result, "ml_relevance_grade", None),
+        "hybrid_score": getattr(result, "hybrid_score", None)
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
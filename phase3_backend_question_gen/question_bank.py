@@ -1,10 +1,14 @@
-from typing import List, Dict, Any
+import re
+import functools
+from itertools import cycle, islice
+from typing import List, Dict, Any, Set, Tuple
 
 # A static collection of high-quality interview questions for common stacks
 # This serves as the Level 3 (Final) fallback when all AI models hit quota limits.
+# Buckets are tuples so accidental in-place edits of the shared bank fail loudly.
 
-QUESTION_BANK: Dict[str, List[Dict[str, Any]]] = {
-    "python": [
+QUESTION_BANK: Dict[str, Tuple[Dict[str, Any], ...]] = {
+    "python": (
         {
             "id": 1001,
             "text": "For a start, I see you've worked with Python. If you were explaining the practical difference between a list and a tuple to a junior developer, how would you describe when it's absolutely critical to use one over the other?",
@@ -29,8 +33,8 @@ QUESTION_BANK: Dict[str, List[Dict[str, Any]]] = {
             "context": "Basic algorithmic thinking.",
             "initial_code": "def reverse_string(s):\n    # Your code here\n    pass"
         }
-    ],
-    "javascript": [
+    ),
+    "javascript": (
         {
             "id": 2001,
             "text": "What is the difference between '==' and '===' in JavaScript?",
@@ -55,8 +59,8 @@ QUESTION_BANK: Dict[str, List[Dict[str, Any]]] = {
             "context": "Array manipulation in JS.",
             "initial_code": "function filterEvens(arr) {\n    // Your code here\n}"
         }
-    ],
-    "react": [
+    ),
+    "react": (
         {
             "id": 3001,
             "text": "What are React Hooks? Explain useState and useEffect.",
@@ -73,8 +77,8 @@ QUESTION_BANK: Dict[str, List[Dict[str, Any]]] = {
             "context": "React architecture.",
             "initial_code": ""
         }
-    ],
-    "general_technical": [
+    ),
+    "general_technical": (
         {
             "id": 5001,
             "text": "Could you walk me through your debugging process? For example, when you hit a complex bug that isn't immediately obvious, what steps do you take to isolate the root cause?",
@@ -99,8 +103,8 @@ QUESTION_BANK: Dict[str, List[Dict[str, Any]]] = {
             "context": "Tech stack decision making.",
             "initial_code": ""
         }
-    ],
-    "general_behavioral": [
+    ),
+    "general_behavioral": (
         {
             "id": 4001,
             "text": "I'd love to hear about a project that really challenged you. What was the biggest hurdle you hit, and how did you navigate through it to get the results you wanted?",
@@ -133,81 +137,89 @@ QUESTION_BANK: Dict[str, List[Dict[str, Any]]] = {
             "context": "Adaptability and learning agility.",
             "initial_code": ""
         }
-    ]
+    )
 }
 
+# Stack-specific buckets, matched against whole resume tokens (so "javascript" no longer
+# also matches "java")
+_SKILL_KEYS = [k for k in QUESTION_BANK if k not in ("general_behavioral", "general_technical")]
+_TOKEN_RE = re.compile(r"[a-z0-9+#.]+")
+# Version numbers and a "js" suffix glued to a name: python3 -> python, reactjs -> react
+_SUFFIX_RE = re.compile(r"(?:js)?\d*$")
+
+# Fixed parts of every fallback interview, built once at import
+_BEHAVIORAL = QUESTION_BANK["general_behavioral"]
+_GENERAL_TECH = QUESTION_BANK["general_technical"]
+_DEFAULT_TECH = QUESTION_BANK["python"]  # Default stack when no skills match
+_SHARED_POOL = _GENERAL_TECH + _BEHAVIORAL
+
+_INTRO_TEMPLATE = "To get us started, could you walk me through your background and what specifically interested you about this {role} position?"
+_INTRO_Q = {
+    "id": 1,
+    "text": "",
+    "type": "behavioral",
+    "difficulty": "easy",
+    "context": "Opening question to establish rapport",
+    "initial_code": ""
+}
+_CLOSING_Q = {
+    "id": 9999,
+    "text": "Before we wrap up, why do you think you'd be a great fit for this role, and what unique value would you bring to our team?",
+    "type": "behavioral",
+    "difficulty": "medium",
+    "context": "Closing question to assess self-awareness and fit",
+    "initial_code": ""
+}
+
+def _tokenize(text: str) -> Set[str]:
+    """
+    Lowercased word tokens; dotted names like "next.js" are kept whole and also split,
+    and every part is also added without a trailing version number or "js".
+    """
+    tokens = set()
+    for tok in _TOKEN_RE.findall(text.lower()):
+        tokens.add(tok.strip("."))
+        for part in tok.split("."):
+            tokens.add(part)
+            tokens.add(_SUFFIX_RE.sub("", part))
+    tokens.discard("")
+    return tokens
+
+@functools.lru_cache(maxsize=64)
+def _middle_pool(matched_skills: Tuple[str, ...]) -> Tuple[Dict[str, Any], ...]:
+    """Matched stacks (or the default one), then the shared pool; built once per skill combination."""
+    candidate_questions = tuple(q for skill in matched_skills for q in QUESTION_BANK[skill])
+    return (candidate_questions or _DEFAULT_TECH) + _SHARED_POOL
+
 def get_fallback_questions(resume_text: str, role: str = "Software Engineer", num_questions: int = 5) -> List[Dict[str, Any]]:
     """
     Detects skills from resume text and pulls matching questions from the bank.
     Ensures realistic interview flow and EXACT question count using cyclic filling.
     """
-    resume_lower = resume_text.lower()
+    resume_tokens = _tokenize(resume_text)
     
     # 1. Start with Introduction
-    intro_question = {
-        "id": 1,
-        "text": f"To get us started, could you walk me through your background and what specifically interested you about this {role} position?",
-        "type": "behavioral",
-        "difficulty": "easy",
-        "context": "Opening question to establish rapport",
-        "initial_code": ""
-    }
+    intro_question = {**_INTRO_Q, "text": _INTRO_TEMPLATE.format(role=role)}
     
-    # 2. Gather Candidates
-    candidate_questions = []
-    
-    # Add matched technical questions
-    for skill, questions in QUESTION_BANK.items():
-        if skill not in ["general_behavioral", "general_technical"] and skill in resume_lower:
-            candidate_questions.extend(questions)
-            
-    # Fallback to general technical if no specific skills found
-    if not candidate_questions:
-        candidate_questions.extend(QUESTION_BANK.get("python", [])) # Default stack
-    
-    # Always add general technicals to the mix
-    candidate_questions.extend(QUESTION_BANK.get("general_technical", []))
-    
-    # Add behavioral questions
-    behavioral_questions = QUESTION_BANK.get("general_behavioral", [])
+    # 2. Gather Candidates: matched stacks (or the default one), then the shared pool
+    middle_pool = _middle_pool(tuple(skill for skill in _SKILL_KEYS if skill in resume_tokens))
     
     # 3. Build Sequence
     final_questions = [intro_question]
     
-    # Calculate needed slots (Total - Intro - Closing)
-    needed_middle = max(0, num_questions - 2)
-    
-    # Create the middle pool
-    middle_pool = candidate_questions + behavioral_questions
-    
-    # CYCLIC FILLING: Ensure we have enough questions by repeating if necessary
-    import copy
-    current_idx = 0
-    while len(final_questions) < (num_questions - 1): # Reserve last slot for closing
-        if not middle_pool: break # Should never happen with our initialization
-        
-        # Get question, clone it to avoid reference issues
-        base_q = middle_pool[current_idx % len(middle_pool)]
-        new_q = copy.deepcopy(base_q)
-        
-        # If we're cycling (reusing), imply it's a follow-up or variation in context
-        if current_idx >= len(middle_pool):
-             new_q["context"] += " (Follow-up / Alternate angle)"
-             
-        final_questions.append(new_q)
-        current_idx += 1
+    # CYCLIC FILLING: Ensure we have enough questions by repeating if necessary.
+    # Every pick is a shallow copy (values are flat); repeats are marked as follow-ups.
+    needed_middle = max(0, num_questions - 2) # Total - Intro - Closing
+    pool_len = len(middle_pool)
+    picks = islice(cycle(middle_pool), needed_middle)
+    final_questions.extend(
+        {**q, "context": q["context"] + " (Follow-up / Alternate angle)"} if i >= pool_len else dict(q)
+        for i, q in enumerate(picks)
+    )
 
     # 4. Closing Question
     if num_questions > 1:
-        closing_question = {
-            "id": 9999,
-            "text": "Before we wrap up, why do you think you'd be a great fit for this role, and what unique value would you bring to our team?",
-            "type": "behavioral",
-            "difficulty": "medium",
-            "context": "Closing question to assess self-awareness and fit",
-            "initial_code": ""
-        }
-        final_questions.append(closing_question)
+        final_questions.append(dict(_CLOSING_Q))
     
     # 5. Reassign IDs sequentially
     for idx, q in enumerate(final_questions, start=1):
@@ -1,8 +1,102 @@
 import os
+import re
 import json
+import functools
 import typing_extensions
+from typing import Iterable, Iterator, Optional
 import google.generativeai as genai
 from dotenv import load_dotenv
+from ai_utils import run_genai_with_rotation, stream_genai_with_rotation
+from question_bank import get_fallback_questions
+from llm_cache import question_cache, sha256_text, prompt_cache_get, prompt_cache_set
+
+# orjson is optional; it parses the model's JSON several times faster than stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _parse_json_response(response_text: str):
+    # response_schema guarantees plain JSON; orjson first, stdlib json if it rejects the text
+    if orjson is not None:
+        try:
+            return orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(response_text)
+
+# Prompt budgets are in tokens; tiktoken's cl100k_base is a close enough proxy for Gemini's
+# tokenizer. Without it, ~4 characters per token is assumed.
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+CHARS_PER_TOKEN = 4
+RESUME_TOKEN_BUDGET = 1500
+JD_TOKEN_BUDGET = 800
+_TERM_RE = re.compile(r"[a-z0-9+#.]+")
+
+@functools.lru_cache(maxsize=1)
+def _get_encoding():
+    """
+    Loads cl100k_base on first use rather than at import: on a cold tiktoken cache this
+    downloads the BPE file, which must not hold up server startup. None if unavailable.
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        print(f"tiktoken encoding unavailable, estimating tokens from length: {e}")
+        return None
+
+def _count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def _trim_to_tokens(text: str, n: int) -> str:
+    """Cuts `text` down to at most `n` tokens."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        tokens = encoding.encode(text)
+        return text if len(tokens) <= n else encoding.decode(tokens[:n])
+    return text[:n * CHARS_PER_TOKEN]
+
+def _pack_resume(resume_text: str, role: str, budget: int = RESUME_TOKEN_BUDGET) -> str:
+    """
+    Fits a resume into `budget` tokens. The header (first paragraph) is always kept; the other
+    paragraphs are packed greedily by how many role terms they mention, then kept in resume order.
+    """
+    if _count_tokens(resume_text) <= budget:
+        return resume_text
+    sections = [section.strip() for section in resume_text.split("\n\n") if section.strip()]
+    if not sections:
+        return _trim_to_tokens(resume_text, budget)
+
+    header = _trim_to_tokens(sections[0], budget)
+    used = _count_tokens(header)
+    role_terms = set(_TERM_RE.findall(role.lower()))
+    overlap = {
+        idx: len(role_terms.intersection(_TERM_RE.findall(sections[idx].lower())))
+        for idx in range(1, len(sections))
+    }
+
+    chosen = []
+    for idx in sorted(overlap, key=lambda i: (-overlap[i], i)):
+        cost = _count_tokens(sections[idx])
+        if used + cost <= budget:
+            chosen.append(idx)
+            used += cost
+    return "\n\n".join([header] + [sections[idx] for idx in sorted(chosen)])
+
+# ijson is optional; with it, streamed responses are parsed question by question
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 # Use TypedDict for schema definition as it's often more reliable for simple JSON constraints with Gemini
 class Question(typing_extensions.TypedDict):
@@ -16,7 +110,169 @@ class Question(typing_extensions.TypedDict):
 class InterviewScript(typing_extensions.TypedDict):
     questions: list[Question]
 
+# Invariant instructions (persona, few-shot, rules, fields). Sent as the model's
+# system_instruction, byte-identical across calls, so the user turn carries only per-call data.
+STATIC_SYSTEM_PROMPT = """
+You are a highly professional, senior technical recruiter and hiring manager.
+Your objective is to conduct a NATURAL, FACE-TO-FACE, and ENGAGING mock interview.
+The candidate data, target role and question count are given in the user message.
+
+INTERVIEWER PERSONA (CRITICAL):
+- **Sound Human**: Speak directly to the candidate as if you are in a room together.
+- **No Meta-Commentary**: NEVER start a question with phrases like "The job description mentions", "Based on your resume", "Since you used Python", or "According to the documentation". Avoid referencing the JD or Resume explicitly in the question text.
+- **Conversational Tone**: Use natural transitions. Don't be robotic.
+- **Professional Curiosity**: Ask follow-up style questions that test depth.
+
+FEW-SHOT EXAMPLES (HOW TO PHRASE QUESTIONS):
+- ❌ BAD (Robotic): "Based on your resume, you used React. What are hooks?"
+- ✅ GOOD (Human): "I noticed you worked on a few React projects. When you were building out the user interface, how did you decide when to use a custom hook versus a standard lifecycle method?"
+- ❌ BAD (Robotic): "The job description emphasizes basic Python. Do you know list comprehensions?"
+- ✅ GOOD (Human): "For this role, we do a lot of data processing in Python. Could you talk me through a time you had to optimize a piece of logic—maybe using something like list comprehensions—to handle a larger dataset?"
+
+STRICT SEQUENCE OF QUESTIONS (IMMUTABLE):
+Your output JSON MUST contain questions in exactly this logical order:
+1. **MANDATORY FIRST QUESTION (ID: 1)**: You MUST start with a warm, professional introduction and then ask: "To get us started, could you walk me through your background and what specifically interested you about this <TARGET ROLE> position?" or a variation of "Tell me about yourself." This is NOT optional.
+2. **Role Fit (ID: 2)**: A natural follow-up on their motivation for the industry or current career direction.
+3. **Experience Deep-Dive (30% of total)**: Conversational deep-dives into their resume projects.
+4. **Skill Alignment (30% of total)**: Natural questions about role requirements (JD-based).
+5. **Behavioral (20% of total)**: Teamwork/Conflict scenarios.
+6. **The Signature Closing (Last ID)**: Professional wrap-up (e.g., "Why hire you?").
+
+REINFORCED PHRASING RULES:
+- NEVER use the words "resume", "job description", "JD", "listing", or "document" in your questions.
+- Act as if you are speaking to the candidate in a real-time Zoom or in-person interview.
+- Use phrases like "I noticed...", "You mentioned...", "I'm curious about...", "Walk me through...".
+
+STRICT RULES:
+- **No Labels**: Do not include category names (like "Behavioral:") inside the question text.
+- **Context Field**: Short internal reason (e.g., "[Resume] Deep-dive on React architecture").
+
+FIELDS:
+- id: Unique int (MUST correspond to the sequence order)
+- text: The natural, human-sounding question text.
+- type: "technical", "behavioral", or "coding"
+- difficulty: "easy", "medium", or "hard"
+- context: Concise internal reasoning.
+- initial_code: (Optional) For coding questions.
+"""
+
+# Condensed equivalent of STATIC_SYSTEM_PROMPT (roughly half the tokens). The full version
+# stays available for A/B checks with DEBUG_PROMPTS=1.
+STATIC_SYSTEM_PROMPT_COMPRESSED = """
+Role: senior technical recruiter running a natural, face-to-face mock interview. Candidate data, target role and question count are in the user message.
+Persona: speak directly to the candidate, conversational, probe depth with follow-ups.
+Never mention "resume", "job description", "JD", "listing" or "document"; no meta openers like "Based on your resume". Prefer "I noticed...", "You mentioned...", "Walk me through...".
+Example: BAD "Based on your resume, you used React. What are hooks?" GOOD "I noticed you worked on a few React projects. How did you decide when to use a custom hook versus a lifecycle method?"
+Order (strict):
+1. id 1: warm intro + "To get us started, could you walk me through your background and what specifically interested you about this <TARGET ROLE> position?" (or "Tell me about yourself"). Mandatory.
+2. id 2: motivation / career direction.
+3. 30% deep-dives into their projects.
+4. 30% role-requirement skills.
+5. 20% behavioral (teamwork/conflict).
+6. Last id: closing (e.g. "Why hire you?").
+No category labels in question text. context = short internal reason, e.g. "[Resume] Deep-dive on React architecture".
+Fields: id = sequence order, type "technical"|"behavioral"|"coding", difficulty "easy"|"medium"|"hard", initial_code only for coding.
+"""
+
+# Per-call user turn, prebuilt once; the only branch is how the question count is chosen
+_USER_PROMPT_TEMPLATE = """
+TARGET ROLE: {{role}}
+{quantity_instruction}
+Target difficulty: {{difficulty}}.
+
+CANDIDATE DATA:
+Resume Content:
+---
+{{resume}}
+---
+
+{{job_desc_section}}
+"""
+_AUTO_COUNT_PROMPT = _USER_PROMPT_TEMPLATE.format(
+    quantity_instruction="Select an optimal number of questions (5-12) based on the resume depth."
+).format
+_FIXED_COUNT_PROMPT = _USER_PROMPT_TEMPLATE.format(
+    quantity_instruction="Generate exactly {num_questions} questions."
+).format
+
+DEBUG_PROMPTS = os.getenv("DEBUG_PROMPTS", "").lower() in ("1", "true", "yes")
+ACTIVE_SYSTEM_PROMPT = STATIC_SYSTEM_PROMPT if DEBUG_PROMPTS else STATIC_SYSTEM_PROMPT_COMPRESSED
+
+# (response_schema, system_instruction) pairs this module calls Gemini with, for ai_utils.prewarm_models
+PREWARM_VARIANTS = [(InterviewScript, ACTIVE_SYSTEM_PROMPT)]
+
+@functools.lru_cache(maxsize=512)
+def _call_llm_cached(prompt_hash: str, prompt: str) -> str:
+    """
+    Exact-prompt cache in front of Gemini: process memory first, then the on-disk cache.
+    Only replies that pass _validated_questions are kept (exceptions are never memoized),
+    and a stored reply that no longer passes is fetched again.
+    """
+    cached = _usable_reply(prompt_cache_get(prompt_hash))
+    if cached is not None:
+        return cached
+    response_text = run_genai_with_rotation(
+        prompt, is_json=True, response_schema=InterviewScript, system_instruction=ACTIVE_SYSTEM_PROMPT
+    )
+    _validated_questions(response_text)
+    prompt_cache_set(prompt_hash, response_text)
+    return response_text
+
+def _questions_from_data(data) -> list[Question]:
+    if isinstance(data, dict) and "questions" in data:
+        return data["questions"]
+    elif isinstance(data, list):
+        return data
+    return []
+
+def _validated_questions(response_text: str) -> list[Question]:
+    """Parses a reply; raises unless it holds at least one question object with text."""
+    questions = _questions_from_data(_parse_json_response(response_text))
+    if not isinstance(questions, list) or not questions or not all(
+        isinstance(q, dict) and isinstance(q.get("text"), str) and q["text"].strip() for q in questions
+    ):
+        raise ValueError("reply holds no usable questions")
+    return questions
+
+def _usable_reply(response_text: Optional[str]) -> Optional[str]:
+    """A stored reply if it passes _validated_questions; anything else counts as a cache miss."""
+    if response_text is None:
+        return None
+    try:
+        _validated_questions(response_text)
+        return response_text
+    except Exception:
+        return None
+
+def _iter_streamed_questions(prompt: str, chunks: list) -> Iterator[Question]:
+    """Yields each question as soon as it is complete in the streamed response; raw text goes to `chunks`."""
+    stream = stream_genai_with_rotation(
+        prompt, is_json=True, response_schema=InterviewScript, system_instruction=ACTIVE_SYSTEM_PROMPT
+    )
+    if ijson is None:
+        chunks.extend(stream)
+        yield from _questions_from_data(_parse_json_response("".join(chunks)))
+        return
+
+    found = ijson.sendable_list()
+    parser = ijson.items_coro(found, "questions.item", use_float=True)
+    for chunk in stream:
+        chunks.append(chunk)
+        parser.send(chunk.encode("utf-8"))
+        yield from found
+        del found[:]
+    parser.close()
+    yield from found
+
 class QuestionGenerator:
+    # Intro/closing detection: one case-insensitive alternation per category, compiled once
+    _INTRO_KEYWORDS = ("tell me about yourself", "walk me through your background",
+                       "introduce yourself", "background", "what interested you")
+    _CLOSING_KEYWORDS = ("why hire you", "why should we hire", "what unique value",
+                         "great fit for this role", "wrap up", "any questions for")
+    _INTRO_RE = re.compile("|".join(map(re.escape, _INTRO_KEYWORDS)), re.IGNORECASE)
+    _CLOSING_RE = re.compile("|".join(map(re.escape, _CLOSING_KEYWORDS)), re.IGNORECASE)
+
     def __init__(self):
         # Configuration is now handled by ai_utils dynamically
         pass
@@ -25,101 +281,111 @@ class QuestionGenerator:
         """
         Generates interview questions based on the provided resume text and target role.
         """
-        
-        # Build difficulty instruction
-        difficulty_instruction = f"Target difficulty: {difficulty}."
-        
-        # Build quantity instruction
-        if auto_select_count:
-            quantity_instruction = "Select an optimal number of questions (5-12) based on the resume depth."
-        else:
-            quantity_instruction = f"Generate exactly {num_questions} questions."
+        return list(self.stream_questions(
+            resume_text, role, num_questions, difficulty, job_description, auto_select_count, stream=False
+        ))
 
+    def stream_questions(self, resume_text: str, role: str = "Software Engineer", num_questions: int = 5, difficulty: str = "mixed", job_description: str = "", auto_select_count: bool = False, stream: bool = True) -> Iterator[Question]:
+        """
+        Yields interview questions as they become available. With stream=True the Gemini
+        response is parsed incrementally, so the opening question is out before the rest exist.
+        """
+        
         # Build job description section
         job_desc_section = "None provided."
         if job_description.strip():
-            job_desc_section = f"--- JOB DESCRIPTION ---\n{job_description[:2000]}\n---"
-        
-        prompt = f"""
-        You are a highly professional, senior technical recruiter and hiring manager. 
-        Your objective is to conduct a NATURAL, FACE-TO-FACE, and ENGAGING mock interview.
-
-        {quantity_instruction}
-        {difficulty_instruction}
-
-        CANDIDATE DATA:
-        Resume Content:
-        ---
-        {resume_text}
-        ---
-
-        {job_desc_section}
-
-        INTERVIEWER PERSONA (CRITICAL):
-        - **Sound Human**: Speak directly to the candidate as if you are in a room together.
-        - **No Meta-Commentary**: NEVER start a question with phrases like "The job description mentions", "Based on your resume", "Since you used Python", or "According to the documentation". Avoid referencing the JD or Resume explicitly in the question text.
-        - **Conversational Tone**: Use natural transitions. Don't be robotic.
-        - **Professional Curiosity**: Ask follow-up style questions that test depth.
-
-        FEW-SHOT EXAMPLES (HOW TO PHRASE QUESTIONS):
-        - ❌ BAD (Robotic): "Based on your resume, you used React. What are hooks?"
-        - ✅ GOOD (Human): "I noticed you worked on a few React projects. When you were building out the user interface, how did you decide when to use a custom hook versus a standard lifecycle method?"
-        - ❌ BAD (Robotic): "The job description emphasizes basic Python. Do you know list comprehensions?"
-        - ✅ GOOD (Human): "For this role, we do a lot of data processing in Python. Could you talk me through a time you had to optimize a piece of logic—maybe using something like list comprehensions—to handle a larger dataset?"
-
-        STRICT SEQUENCE OF QUESTIONS (IMMUTABLE):
-        Your output JSON MUST contain questions in exactly this logical order:
-        1. **MANDATORY FIRST QUESTION (ID: 1)**: You MUST start with a warm, professional introduction and then ask: "To get us started, could you walk me through your background and what specifically interested you about this {role} position?" or a variation of "Tell me about yourself." This is NOT optional.
-        2. **Role Fit (ID: 2)**: A natural follow-up on their motivation for the industry or current career direction.
-        3. **Experience Deep-Dive (30% of total)**: Conversational deep-dives into their resume projects.
-        4. **Skill Alignment (30% of total)**: Natural questions about role requirements (JD-based).
-        5. **Behavioral (20% of total)**: Teamwork/Conflict scenarios.
-        6. **The Signature Closing (Last ID)**: Professional wrap-up (e.g., "Why hire you?").
-
-        REINFORCED PHRASING RULES:
-        - NEVER use the words "resume", "job description", "JD", "listing", or "document" in your questions.
-        - Act as if you are speaking to the candidate in a real-time Zoom or in-person interview.
-        - Use phrases like "I noticed...", "You mentioned...", "I'm curious about...", "Walk me through...".
-
-        STRICT RULES:
-        - **No Labels**: Do not include category names (like "Behavioral:") inside the question text.
-        - **Context Field**: Short internal reason (e.g., "[Resume] Deep-dive on React architecture").
-
-        RESPONSE FORMAT:
-        Return a JSON object with a single key "questions" containing:
-        - id: Unique int (MUST correspond to the sequence order)
-        - text: The natural, human-sounding question text.
-        - type: "technical", "behavioral", or "coding"
-        - difficulty: "easy", "medium", or "hard"
-        - context: Concise internal reasoning.
-        - initial_code: (Optional) For coding questions.
-        Return ONLY raw JSON.
-        """
+            job_desc_section = f"--- JOB DESCRIPTION ---\n{_trim_to_tokens(job_description, JD_TOKEN_BUDGET)}\n---"
+        
+        # The static block travels as the system instruction; the user turn is only the per-call data
+        template = _AUTO_COUNT_PROMPT if auto_select_count else _FIXED_COUNT_PROMPT
+        prompt = template(
+            role=role,
+            num_questions=num_questions,
+            difficulty=difficulty,
+            resume=_pack_resume(resume_text, role),
+            job_desc_section=job_desc_section
+        )
 
-        from ai_utils import run_genai_with_rotation
-        from question_bank import get_fallback_questions
+        # Resume, JD and settings form the exact key; the role is the cached text
+        cache_exact_key = f"{sha256_text(resume_text)}|{sha256_text(job_description)}|{difficulty}|{num_questions}|{auto_select_count}"
+        prompt_hash = sha256_text(ACTIVE_SYSTEM_PROMPT + prompt)
+        emitted = 0
         
         try:
-            response_text = run_genai_with_rotation(prompt, is_json=True)
-            data = json.loads(response_text)
-            
-            questions = []
-            if "questions" in data:
-                questions = data["questions"]
-            elif isinstance(data, list):
-                questions = data
+            cached_text = _usable_reply(question_cache.get(role, exact_key=cache_exact_key))
+            response_text = cached_text
+            if response_text is None and stream:
+                response_text = _usable_reply(prompt_cache_get(prompt_hash))
             
-            # Sort by ID first
-            questions.sort(key=lambda x: x.get("id", 0))
+            streamed_chunks = None
+            if response_text is not None or not stream:
+                response_text = response_text or _call_llm_cached(prompt_hash, prompt)
+                questions = _validated_questions(response_text)
+                # Sort by ID first
+                questions.sort(key=lambda x: x.get("id", 0))
+            else:
+                streamed_chunks = []
+                questions = _iter_streamed_questions(prompt, streamed_chunks)
             
-            # Enforce realistic interview structure
-            questions = self._enforce_interview_structure(questions, role, num_questions)
+            # Enforce realistic interview structure. A fully known list goes straight through the
+            # enforcer; only a live stream uses the incremental front end.
+            if streamed_chunks is None:
+                structured = self._enforce_interview_structure(questions, role, num_questions)
+            else:
+                structured = self._stream_interview_structure(questions, role, num_questions)
+            for q in structured:
+                emitted += 1
+                yield q
             
-            print(f"✅ Generated {len(questions)} questions with realistic interview ordering")
-            return questions
+            if streamed_chunks is not None:
+                response_text = "".join(streamed_chunks)
+            # Only a complete, well-formed reply is worth keeping
+            if _usable_reply(response_text) is None:
+                print("Not caching the question reply: it holds no usable questions")
+            else:
+                if streamed_chunks is not None:
+                    prompt_cache_set(prompt_hash, response_text)
+                if cached_text is None:
+                    question_cache.set(role, response_text, exact_key=cache_exact_key)
+            print(f"✅ Generated {emitted} questions with realistic interview ordering")
         except Exception as e:
+            fallback_questions = get_fallback_questions(resume_text, role, num_questions)
+            if emitted:
+                # Part of the interview is already out; complete it from the bank (ends with its closing)
+                print(f"Question stream failed after {emitted} questions: {e}. Filling the rest from fallback questions.")
+                for q in fallback_questions[emitted:]:
+                    emitted += 1
+                    yield {**q, "id": emitted}
+                return
             print(f"Question Generation AI failed: {e}. Using high-quality fallback questions.")
-            return get_fallback_questions(resume_text, role, num_questions)
+            yield from fallback_questions
+    
+    def _stream_interview_structure(self, questions: Iterable[Question], role: str, num_questions: int) -> Iterator[Question]:
+        """
+        Incremental front end to _enforce_interview_structure with the same output. Only
+        questions whose final position is already certain are yielded as they arrive: an opening
+        intro, then the following middles up to position num_questions - 1, stopping at the first
+        closing-like question (the enforcer may move it to the end, shifting everything after it).
+        The rest follows from the enforcer once the full set is known. Yielded questions are
+        copies carrying their final sequential id.
+        """
+        received = []
+        sent = 0
+        streaming = True
+        for q in questions:
+            received.append(q)
+            text = q.get("text", "")
+            if len(received) == 1:
+                streaming = self._INTRO_RE.search(text) is not None
+            elif self._CLOSING_RE.search(text) or len(received) > num_questions - 1:
+                streaming = False
+            if streaming:
+                sent += 1
+                yield {**q, "id": sent}
+        
+        final_questions = self._enforce_interview_structure(received, role, num_questions)
+        for idx, q in enumerate(final_questions[sent:], start=sent + 1):
+            yield {**q, "id": idx}
     
     def _enforce_interview_structure(self, questions: list[Question], role: str, num_questions: int) -> list[Question]:
         """
@@ -131,21 +397,14 @@ class QuestionGenerator:
         if not questions or len(questions) == 0:
             return questions
         
-        # Define intro question patterns
-        intro_keywords = ["tell me about yourself", "walk me through your background", 
-                         "introduce yourself", "background", "what interested you"]
-        
-        # Define closing question patterns
-        closing_keywords = ["why hire you", "why should we hire", "what unique value", 
-                           "great fit for this role", "wrap up", "any questions for"]
+        intro_search = self._INTRO_RE.search
+        closing_search = self._CLOSING_RE.search
         
         def is_intro_question(q: Question) -> bool:
-            text_lower = q.get("text", "").lower()
-            return any(keyword in text_lower for keyword in intro_keywords)
+            return intro_search(q.get("text", "")) is not None
         
         def is_closing_question(q: Question) -> bool:
-            text_lower = q.get("text", "").lower()
-            return any(keyword in text_lower for keyword in closing_keywords)
+            return closing_search(q.get("text", "")) is not None
         
         # Check if first question is intro
         first_is_intro = is_intro_question(questions[0])
@@ -171,9 +430,10 @@ class QuestionGenerator:
         
         # Extract intro, closing, and middle questions
         for q in questions:
-            if is_intro_question(q) and not intro_q:
+            text = q.get("text", "")
+            if not intro_q and intro_search(text):
                 intro_q = q
-            elif is_closing_question(q) and not closing_q:
+            elif not closing_q and closing_search(text):
                 closing_q = q
             else:
                 middle_questions.append(q)
@@ -209,7 +469,6 @@ class QuestionGenerator:
         target_middle_count = num_questions - (2 if closing_q else 1)
         
         # GAP FILLING: If AI returned too few questions, cycle existing ones to fill
-        import copy
         current_fill_idx = 0
         while len(middle_questions) < target_middle_count:
             if not middle_questions: 
@@ -222,8 +481,8 @@ class QuestionGenerator:
                 
             # Clone from existing middle questions
             base_q = middle_questions[current_fill_idx % len(middle_questions)]
-            new_q = copy.deepcopy(base_q)
-            new_q["context"] += " (Extended discussion)"
+            # Question is a flat dict of str/int, so a shallow copy is enough
+            new_q = {**base_q, "context": base_q.get("context", "") + " (Extended discussion)"}
             middle_questions.append(new_q)
             current_fill_idx += 1
             print("  → Added gap-filler question to meet requested count")
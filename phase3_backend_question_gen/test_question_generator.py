@@ -0,0 +1,50 @@
+import copy
+import random
+import unittest
+
+from question_generator import QuestionGenerator
+
+# Texts chosen to hit the intro and closing detection in every combination
+TEXT_POOL = [
+    "Tell me about yourself.",
+    "Walk me through your background.",
+    "What interested you in this position?",
+    "How would you design a rate limiter?",
+    "Explain how a hash map handles collisions.",
+    "Describe a production bug you tracked down.",
+    "Why should we hire you?",
+    "Any questions for us?",
+    "Before we wrap up, what unique value would you bring?",
+]
+
+class StreamStructureTest(unittest.TestCase):
+    """The NDJSON stream must deliver the same interview as the non-streamed path."""
+
+    def test_stream_matches_enforcer(self):
+        generator = QuestionGenerator()
+        rng = random.Random(0)
+        for _ in range(2000):
+            questions = [
+                {"id": i + 1, "text": rng.choice(TEXT_POOL), "type": "technical",
+                 "difficulty": "medium", "context": ""}
+                for i in range(rng.randint(0, 10))
+            ]
+            num_questions = rng.randint(1, 10)
+            expected = generator._enforce_interview_structure(copy.deepcopy(questions), "Software Engineer", num_questions)
+            streamed = list(generator._stream_interview_structure(
+                iter(copy.deepcopy(questions)), "Software Engineer", num_questions
+            ))
+            self.assertEqual(streamed, expected, msg=f"num_questions={num_questions}, texts={[q['text'] for q in questions]}")
+
+    def test_opening_intro_is_yielded_before_the_stream_ends(self):
+        generator = QuestionGenerator()
+
+        def questions():
+            yield {"id": 1, "text": "Tell me about yourself.", "type": "behavioral", "difficulty": "easy", "context": ""}
+            raise AssertionError("read past the first question")
+
+        stream = generator._stream_interview_structure(questions(), "Software Engineer", 5)
+        self.assertEqual(next(stream)["text"], "Tell me about yourself.")
+
+if __name__ == "__main__":
+    unittest.main()
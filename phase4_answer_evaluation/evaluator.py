@@ -1,20 +1,53 @@
-from pydantic import BaseModel
-from typing import List, Dict
+from dataclasses import dataclass
+from typing import List, Dict, Tuple, Optional, Literal
 import os
+import sys
+import asyncio
+import json
+import functools
+import typing_extensions
 import google.generativeai as genai
 from dotenv import load_dotenv
 
 load_dotenv()
 
-class EvaluationResult(BaseModel):
+# Shared Gemini utilities and caches live with the backend
+AI_UTILS_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'phase3_backend_question_gen'))
+if AI_UTILS_PATH not in sys.path:
+    sys.path.append(AI_UTILS_PATH)
+
+from ai_utils import run_genai_with_rotation
+from llm_cache import evaluation_cache, sha256_text, prompt_cache_get, prompt_cache_set
+
+# orjson is optional; it parses the model's JSON several times faster than stdlib json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Response schemas handed to Gemini (short keys, see the rubric legend)
+class BriefEvaluation(typing_extensions.TypedDict):
+    s: int
+    f: str
+    m: list[str]
+
+class FullEvaluation(typing_extensions.TypedDict):
+    s: int
+    f: str
+    m: list[str]
+    i: str
+    a: str
+
+@dataclass(slots=True, frozen=True)
+class EvaluationResult:
     score: float  # 0-10
     feedback: str
     missing_keywords: List[str]
     improvements: str = ""
     ideal_answer: str = ""  # The "sample/ideal" answer
-    ml_relevance_score: float = None
-    ml_relevance_grade: str = None
-    hybrid_score: float = None
+    ml_relevance_score: Optional[float] = None
+    ml_relevance_grade: Optional[str] = None
+    hybrid_score: Optional[float] = None
 
 try:
     from sklearn.feature_extraction.text import TfidfVectorizer
@@ -52,89 +85,298 @@ def calculate_tfidf_score(user_answer: str, ideal_answer: str) -> dict:
         print(f"TF-IDF scoring failed: {e}")
         return {"relevance_score": 0.5, "grade": "N/A"}
 
+# Upper bound on concurrent Gemini calls when answers are evaluated one by one
+MAX_CONCURRENT_EVALUATIONS = 5
+
+# Invariant rubrics sent as the system instruction; only the question/answer turn changes per call.
+# Short keys keep the model's output small: "brief" asks for score/feedback/missing keywords,
+# "full" also asks for improvements and the ideal answer.
+EVALUATION_RUBRIC_PROMPT_BRIEF = """
+You are an expert technical interviewer evaluating a candidate's response.
+The question and the candidate's answer are given in the user message.
+Score the answer from 0-10 and give short, helpful feedback.
+
+Legend: s=score 0-10, f=feedback, m=key terms the answer missed.
+"""
+
+EVALUATION_RUBRIC_PROMPT_FULL = """
+You are an expert technical interviewer evaluating a candidate's response.
+The question and the candidate's answer are given in the user message.
+
+OBJECTIVES:
+1. Score the answer from 0-10.
+2. Provide helpful feedback.
+3. **CRITICAL**: Provide the PERFECT 'Ideal Answer'.
+
+**CONSTRAINT: KEEP THE IDEAL ANSWER VERY SHORT AND CONCISE (Max 2-3 sentences). Be direct.**
+
+Legend: s=score 0-10, f=feedback, m=key terms the answer missed, i=improvements (what to do better), a=ideal answer (max 2-3 sentences, direct and simple).
+"""
+
+_RUBRICS = {"brief": EVALUATION_RUBRIC_PROMPT_BRIEF, "full": EVALUATION_RUBRIC_PROMPT_FULL}
+_SCHEMAS = {"brief": BriefEvaluation, "full": FullEvaluation}
+
+# Short response keys -> EvaluationResult field names
+_SHORT_KEYS = {"s": "score", "f": "feedback", "m": "missing_keywords", "i": "improvements", "a": "ideal_answer"}
+
+def _expand_keys(data: dict) -> dict:
+    # Long keys are accepted too, in case the model ignores the legend
+    return {_SHORT_KEYS.get(k, k): v for k, v in data.items()}
+
+def _is_skipped(answer: str) -> bool:
+    return not answer or answer.strip() == "" or "no answer provided" in answer.lower()
+
+# Per-answer user turns, prebuilt once: full detail? -> bound str.format
+_ANSWER_TEMPLATE = 'QUESTION: "{q}"\nCANDIDATE ANSWER: "{a}"\nBe fair and critical.'
+_ANSWER_TEMPLATES = {
+    False: (_ANSWER_TEMPLATE + "\n").format,
+    True: (_ANSWER_TEMPLATE + " The ideal answer shows what a 10/10 answer looks like.\n").format,
+}
+
+def _answer_block(question: str, answer: str, detail_level: str = "brief") -> str:
+    return _ANSWER_TEMPLATES[detail_level == "full"](q=question, a=answer)
+
+# Skipped answers are scored locally; only the ideal answer needs the LLM, once per question
+IDEAL_ANSWER_PROMPT = """
+You are an expert technical interviewer. Write the ideal 10/10 answer to the interview
+question in the user message.
+
+**CONSTRAINT: KEEP THE IDEAL ANSWER VERY SHORT AND CONCISE (Max 2-3 sentences). Be direct.**
+
+Legend: a=ideal answer.
+"""
+
+class IdealAnswer(typing_extensions.TypedDict):
+    a: str
+
+# (response_schema, system_instruction) pairs this module calls Gemini with, for ai_utils.prewarm_models
+PREWARM_VARIANTS = [
+    variant
+    for level in ("brief", "full")
+    for variant in ((_SCHEMAS[level], _RUBRICS[level]), (list[_SCHEMAS[level]], _RUBRICS[level]))
+] + [(IdealAnswer, IDEAL_ANSWER_PROMPT)]
+
+_IDEAL_CACHE: Dict[str, str] = {}
+
+def _ideal_answer_for(question: str) -> str:
+    question_hash = sha256_text(question)
+    ideal = _IDEAL_CACHE.get(question_hash)
+    if ideal is None:
+        prompt = f'QUESTION: "{question}"\n'
+        response_text = _call_llm_cached(sha256_text(IDEAL_ANSWER_PROMPT + prompt), prompt, IdealAnswer, IDEAL_ANSWER_PROMPT)
+        ideal = _parse_evaluation_json(response_text).get("a", "")
+        _IDEAL_CACHE[question_hash] = ideal
+    return ideal
+
+def _parse_evaluation_json(response_text: str) -> dict:
+    # response_schema guarantees plain JSON; orjson first, stdlib json if it rejects the text
+    if orjson is not None:
+        try:
+            return orjson.loads(response_text)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(response_text)
+
+def _batch_items(data) -> Optional[list]:
+    """The evaluation array of a batch reply (bare, or wrapped in an object); None if absent."""
+    if isinstance(data, dict):
+        data = next((v for v in data.values() if isinstance(v, list)), None)
+    return data if isinstance(data, list) else None
+
+def _check_response(response_text: str, expected_items: Optional[int]) -> None:
+    """Raises unless the reply parses and, for a batch, holds exactly `expected_items` evaluations."""
+    data = _parse_evaluation_json(response_text)
+    if expected_items is not None:
+        items = _batch_items(data)
+        if items is None or len(items) != expected_items:
+            got = len(items) if items is not None else type(data).__name__
+            raise ValueError(f"expected {expected_items} evaluations, got {got}")
+
+@functools.lru_cache(maxsize=512)
+def _call_llm_cached(prompt_hash: str, prompt: str, response_schema=None, system_instruction: Optional[str] = None,
+                     expected_items: Optional[int] = None) -> str:
+    """
+    Exact-prompt cache in front of Gemini: process memory first, then the on-disk cache.
+    Only replies that pass _check_response are kept (exceptions are never memoized), and a
+    stored reply that no longer passes is fetched again.
+    """
+    cached = prompt_cache_get(prompt_hash)
+    if cached is not None:
+        try:
+            _check_response(cached, expected_items)
+            return cached
+        except Exception:
+            pass
+    # JSON mode plus a response schema: Gemini returns exactly the shape we parse
+    response_text = run_genai_with_rotation(
+        prompt, is_json=True, response_schema=response_schema, system_instruction=system_instruction
+    )
+    _check_response(response_text, expected_items)
+    prompt_cache_set(prompt_hash, response_text)
+    return response_text
+
 class AnswerEvaluator:
     def __init__(self):
         # In a real app, this would load models or connect to LLM
         pass
     
-    def evaluate(self, question: str, answer: str, context_keywords: List[str] = []) -> EvaluationResult:
-        # Determine if answer is missing
-        is_skipped = not answer or answer.strip() == "" or "no answer provided" in answer.lower()
-        
-        api_key = os.getenv("GEMINI_API_KEY") # Check mostly for environment presence logic if needed
-        # We generally rely on run_genai_with_rotation to handle keys now
-        
-        prompt = f"""
-        You are an expert technical interviewer evaluating a candidate's response.
-        
-        QUESTION: "{question}"
-        CANDIDATE ANSWER: "{'NO ANSWER PROVIDED. CANDIDATE SKIPPED.' if is_skipped else answer}"
-        
-        OBJECTIVES:
-        1. Score the answer from 0-10. {'(MUST BE 0 since candidate skipped)' if is_skipped else '(Be fair and critical)'}
-        2. Provide helpful feedback.
-        3. **CRITICAL**: Provide the PERECT 'Ideal Answer'. {'Since the candidate skipped, create a 10/10 answer.' if is_skipped else 'Show what a 10/10 answer looks like.'}
-        
-        **CONSTRAINT: KEEP THE IDEAL ANSWER VERY SHORT AND CONCISE (Max 2-3 sentences). Be direct.**
-        
-        RETURN JSON ONLY:
-        {{
-            "score": int,
-            "feedback": "string",
-            "missing_keywords": ["list", "of", "key", "terms", "missed"],
-            "improvements": "string (what to do better)",
-            "ideal_answer": "string (Max 2-3 sentences, direct and simple)"
-        }}
+    def evaluate(self, question: str, answer: str, context_keywords: List[str] = [],
+                 detail_level: Literal["brief", "full"] = "brief") -> EvaluationResult:
+        """
+        Scores one answer. "brief" returns score, feedback and missing keywords only;
+        "full" also returns improvements, the ideal answer and the TF-IDF hybrid_score.
+        `score` is the model's score in both modes.
         """
+        # Missing answers never reach the evaluation prompt
+        if _is_skipped(answer):
+            return self._skipped_result(question, context_keywords, detail_level)
+        
+        # Static rubric as system instruction, per-answer details as the user turn
+        rubric = _RUBRICS[detail_level]
+        prompt = _answer_block(question, answer, detail_level)
 
-        from ai_utils import run_genai_with_rotation
         try:
-            print(f"Evaluating answer... (Skipped={is_skipped})")
-            # We use is_json=True to enforce JSON mode
-            response_text = run_genai_with_rotation(prompt, is_json=True)
-            
-            # Robust JSON cleanup logic
-            text = response_text.strip()
-            if text.startswith("```json"): text = text[7:]
-            if text.startswith("```"): text = text[3:]
-            if text.endswith("```"): text = text[:-3]
-            text = text.strip()
-            
-            import json
-            data = json.loads(text)
-            
-            # ML: TF-IDF relevance scoring
-            tfidf_result = calculate_tfidf_score(
-                answer, 
-                data.get("ideal_answer", "")
+            print("Evaluating answer...")
+            # Same question + the same answer (after whitespace/case normalization) reuses the earlier evaluation
+            cache_exact_key = f"{sha256_text(question)}|{detail_level}"
+            cached_text = evaluation_cache.get(answer, exact_key=cache_exact_key)
+            response_text = cached_text or _call_llm_cached(
+                sha256_text(rubric + prompt), prompt, _SCHEMAS[detail_level], rubric
             )
+            data = _parse_evaluation_json(response_text)
+            if cached_text is None:
+                evaluation_cache.set(answer, response_text, exact_key=cache_exact_key)
             
-            # Hybrid score: 70% Gemini + 30% TF-IDF
-            gemini_score = float(data.get("score", 5))
-            tfidf_normalized = (tfidf_result["relevance_score"] / 100) * 10
-            hybrid_score = round(
-                (gemini_score * 0.7) + (tfidf_normalized * 0.3), 1
+            return self._build_result(answer, data, detail_level)
+        except Exception as e:
+            print(f"Evaluation AI failed: {e}")
+            return self._fallback_evaluate(question, answer, context_keywords, str(e))
+
+    def evaluate_batch(self, pairs: List[Tuple[str, str, List[str]]],
+                       detail_level: Literal["brief", "full"] = "brief") -> List[EvaluationResult]:
+        """
+        Evaluates a whole interview in a single Gemini call.
+        Each pair is (question, answer, context_keywords); results come back in the same order.
+        Answers already in the cache are not re-sent; if the batched call fails or returns a
+        malformed array, every uncached pair is evaluated individually instead.
+        """
+        results: List[EvaluationResult] = [None] * len(pairs)
+        pending = []
+        for idx, (question, answer, keywords) in enumerate(pairs):
+            if _is_skipped(answer):
+                results[idx] = self._skipped_result(question, keywords, detail_level)
+                continue
+            cached_text = evaluation_cache.get(answer, exact_key=f"{sha256_text(question)}|{detail_level}")
+            if cached_text:
+                try:
+                    results[idx] = self._build_result(answer, _parse_evaluation_json(cached_text), detail_level)
+                    continue
+                except Exception:
+                    pass
+            pending.append(idx)
+
+        if len(pending) == 1:
+            question, answer, keywords = pairs[pending[0]]
+            results[pending[0]] = self.evaluate(question, answer, keywords, detail_level)
+            pending = []
+
+        if pending:
+            items = []
+            for n, idx in enumerate(pending, start=1):
+                question, answer, _ = pairs[idx]
+                items.append(f"ITEM {n}:\n{_answer_block(question, answer, detail_level)}")
+            rubric = _RUBRICS[detail_level]
+            prompt = (
+                f"Evaluate each of the {len(pending)} items below independently. Return an array with "
+                f"exactly {len(pending)} evaluations, in the same order as the items.\n\n"
+                + "\n".join(items)
             )
-            
-            # Add ML fields to response
-            data["ml_relevance_score"] = tfidf_result["relevance_score"]
-            data["ml_relevance_grade"] = tfidf_result["grade"]
-            data["hybrid_score"] = hybrid_score
-            data["score"] = hybrid_score  # replace raw score
-            
+            try:
+                print(f"Evaluating {len(pending)} answers in one batch...")
+                # A reply with the wrong number of evaluations raises here and is never cached
+                data = _batch_items(_parse_evaluation_json(_call_llm_cached(
+                    sha256_text(rubric + prompt), prompt, list[_SCHEMAS[detail_level]], rubric, len(pending)
+                )))
+                for idx, item in zip(pending, data):
+                    question, answer, _ = pairs[idx]
+                    results[idx] = self._build_result(answer, item, detail_level)
+                    evaluation_cache.set(answer, json.dumps(item), exact_key=f"{sha256_text(question)}|{detail_level}")
+            except Exception as e:
+                print(f"Batch evaluation failed ({e}), evaluating answers concurrently")
+                singles = asyncio.run(self.evaluate_many([pairs[idx] for idx in pending], detail_level))
+                for idx, result in zip(pending, singles):
+                    results[idx] = result
+
+        return results
+
+    async def aevaluate(self, question: str, answer: str, context_keywords: List[str] = [],
+                        detail_level: Literal["brief", "full"] = "brief",
+                        semaphore: Optional[asyncio.Semaphore] = None) -> EvaluationResult:
+        """
+        Async wrapper around evaluate(). The Gemini call (with key rotation) stays synchronous
+        and runs in a worker thread; the semaphore caps how many are in flight at once.
+        """
+        if semaphore is None:
+            return await asyncio.to_thread(self.evaluate, question, answer, context_keywords, detail_level)
+        async with semaphore:
+            return await asyncio.to_thread(self.evaluate, question, answer, context_keywords, detail_level)
+
+    async def evaluate_many(self, pairs: List[Tuple[str, str, List[str]]],
+                            detail_level: Literal["brief", "full"] = "brief") -> List[EvaluationResult]:
+        """Evaluates (question, answer, context_keywords) pairs concurrently, preserving order."""
+        semaphore = asyncio.Semaphore(MAX_CONCURRENT_EVALUATIONS)
+        return await asyncio.gather(*(self.aevaluate(q, a, kw, detail_level, semaphore) for q, a, kw in pairs))
+
+    def _skipped_result(self, question: str, context_keywords: List[str], detail_level: str = "brief") -> EvaluationResult:
+        if detail_level != "full":
+            return EvaluationResult(score=0, feedback="No answer submitted.", missing_keywords=list(context_keywords))
+        try:
+            ideal_answer = _ideal_answer_for(question)
+        except Exception as e:
+            print(f"Ideal answer generation failed: {e}")
+            ideal_answer = "No ideal answer provided."
+        return EvaluationResult(
+            score=0,
+            feedback="No answer submitted.",
+            missing_keywords=list(context_keywords),
+            improvements="Attempt the question next time.",
+            ideal_answer=ideal_answer
+        )
+
+    def _build_result(self, answer: str, data: dict, detail_level: str = "brief") -> EvaluationResult:
+        # `score` is always the model's 0-10 score; the TF-IDF blend lives in hybrid_score only
+        data = _expand_keys(data)
+        gemini_score = float(data.get("score", 5))
+        if detail_level != "full":
+            # No ideal answer to compare against, so there is no hybrid score
             return EvaluationResult(
-                score=data.get("score", 0),
+                score=gemini_score,
                 feedback=data.get("feedback", "No feedback provided."),
-                missing_keywords=data.get("missing_keywords", []),
-                improvements=data.get("improvements", "No specific improvements suggested."),
-                ideal_answer=data.get("ideal_answer", "No ideal answer provided."),
-                ml_relevance_score=data.get("ml_relevance_score"),
-                ml_relevance_grade=data.get("ml_relevance_grade"),
-                hybrid_score=data.get("hybrid_score")
+                missing_keywords=data.get("missing_keywords", [])
             )
-        except Exception as e:
-            print(f"Evaluation AI failed: {e}")
-            return self._fallback_evaluate(question, answer, context_keywords, str(e))
+        
+        # ML: TF-IDF relevance scoring
+        tfidf_result = calculate_tfidf_score(
+            answer, 
+            data.get("ideal_answer", "")
+        )
+        
+        # Hybrid score: 70% Gemini + 30% TF-IDF
+        tfidf_normalized = (tfidf_result["relevance_score"] / 100) * 10
+        hybrid_score = round(
+            (gemini_score * 0.7) + (tfidf_normalized * 0.3), 1
+        )
+        
+        return EvaluationResult(
+            score=gemini_score,
+            feedback=data.get("feedback", "No feedback provided."),
+            missing_keywords=data.get("missing_keywords", []),
+            improvements=data.get("improvements", "No specific improvements suggested."),
+            ideal_answer=data.get("ideal_answer", "No ideal answer provided."),
+            ml_relevance_score=tfidf_result["relevance_score"],
+            ml_relevance_grade=tfidf_result["grade"],
+            hybrid_score=hybrid_score
+        )
 
     def _fallback_evaluate(self, question: str, answer: str, context_keywords: List[str], error_msg: str = "") -> EvaluationResult:
         # User-friendly fallback logic